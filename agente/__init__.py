@@ -5,29 +5,53 @@ Módulo Agente - EcoAgent
 Este módulo contiene todos los componentes del agente inteligente:
 - tools.py: Herramientas para automatización
 - rag_pipeline.py: Pipeline RAG para recuperación de información
+- planner.py: Planificador/ejecutor paralelo de herramientas
 - eco_agent.py: Agente principal integrado
 
+Los componentes se importan bajo demanda (PEP 562) para que `import agente`
+no cargue LangChain hasta que realmente se use.
+
 Autor: EcoAgent Team
 Fecha: 2024
 """
 
-from .tools import (
-    verificar_elegibilidad_producto,
-    generar_etiqueta_devolucion,
-    consultar_politicas_devolucion,
-    ProductoTools
-)
+import importlib
+
+# Nombre exportado -> submódulo que lo define
+_LAZY_EXPORTS = {
+    # Tools
+    "verificar_elegibilidad_producto": ".tools",
+    "verificar_elegibilidad_batch": ".tools",
+    "generar_etiqueta_devolucion": ".tools",
+    "consultar_politicas_devolucion": ".tools",
+    "ProductoTools": ".tools",
+    
+    # RAG Pipeline
+    "EcoRAGPipeline": ".rag_pipeline",
+    "create_rag_pipeline": ".rag_pipeline",
+    
+    # Planner
+    "LLMCompilerAgent": ".planner",
+    
+    # Main Agent
+    "EcoAgent": ".eco_agent",
+    "EcoAgentLogger": ".eco_agent",
+    "create_eco_agent": ".eco_agent"
+}
+
 
-from .rag_pipeline import (
-    EcoRAGPipeline,
-    create_rag_pipeline
-)
+def __getattr__(name):
+    """Importa el submódulo correspondiente la primera vez que se accede."""
+    if name in _LAZY_EXPORTS:
+        value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_EXPORTS))
 
-from .eco_agent import (
-    EcoAgent,
-    EcoAgentLogger,
-    create_eco_agent
-)
 
 __version__ = "1.0.0"
 __author__ = "EcoAgent Team"
@@ -35,6 +59,7 @@ __author__ = "EcoAgent Team"
 __all__ = [
     # Tools
     "verificar_elegibilidad_producto",
+    "verificar_elegibilidad_batch",
     "generar_etiqueta_devolucion", 
     "consultar_politicas_devolucion",
     "ProductoTools",
@@ -43,6 +68,9 @@ __all__ = [
     "EcoRAGPipeline",
     "create_rag_pipeline",
     
+    # Planner
+    "LLMCompilerAgent",
+    
     # Main Agent
     "EcoAgent",
     "EcoAgentLogger",
@@ -0,0 +1,175 @@
+"""
+Caches para EcoAgent
+====================
+
+Este módulo contiene las estructuras de cache usadas por el agente y el
+pipeline RAG:
+- TTLCache: cache LRU con expiración para coincidencias exactas
+- SemanticCache: cache por similitud coseno entre embeddings
+
+Autor: EcoAgent Team
+Fecha: 2024
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import numpy as np
+
+try:
+    import simsimd
+except ImportError:  # Dependencia opcional: se usa NumPy/BLAS
+    simsimd = None
+
+
+def normalize_query(text: str) -> str:
+    """Normaliza una consulta (minúsculas, sin espacios redundantes)."""
+    return " ".join(text.lower().split())
+
+
+def query_hash(text: str) -> str:
+    """Calcula la clave SHA-256 de una consulta normalizada."""
+    return hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()
+
+
+def cosine_similarities(matrix: np.ndarray, vector: np.ndarray) -> np.ndarray:
+    """
+    Calcula la similitud coseno de un vector contra cada fila de una matriz.
+    
+    Usa los kernels SIMD de SimSIMD si está instalado; en caso contrario,
+    un producto matriz-vector (ambos deben venir normalizados).
+    
+    Args:
+        matrix (np.ndarray): Matriz float32 (n × d) con vectores normalizados
+        vector (np.ndarray): Vector float32 (d) normalizado
+        
+    Returns:
+        np.ndarray: Similitudes de cada fila
+    """
+    if simsimd is not None:
+        distances = np.asarray(simsimd.cdist(vector[np.newaxis, :], matrix, metric="cosine"))
+        return 1.0 - distances.reshape(-1)
+    return matrix @ vector
+
+
+class TTLCache:
+    """Cache LRU con tiempo de vida por entrada."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        """
+        Inicializar el cache.
+
+        Args:
+            maxsize (int): Número máximo de entradas
+            ttl (float): Segundos de vida de cada entrada
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Obtiene un valor si existe y no ha expirado."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        """Guarda un valor, expulsando la entrada menos usada si es necesario."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Vacía el cache."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SemanticCache:
+    """Cache que devuelve resultados de consultas con embeddings similares."""
+
+    def __init__(self, threshold: float = 0.95, maxsize: int = 1024):
+        """
+        Inicializar el cache semántico.
+
+        Args:
+            threshold (float): Similitud coseno mínima para considerar un acierto
+            maxsize (int): Número máximo de entradas (expulsión LRU)
+        """
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self._vecs: Optional[np.ndarray] = None
+        self._values: List[Any] = []
+        self._last_used: List[int] = []
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, vector) -> Optional[Any]:
+        """Devuelve el valor más similar si supera el umbral."""
+        with self._lock:
+            if self._vecs is None or not self._values:
+                return None
+
+            sims = cosine_similarities(self._vecs, self._normalize(vector))
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+
+            self._clock += 1
+            self._last_used[best] = self._clock
+            return self._values[best]
+
+    def add(self, vector, value: Any):
+        """Agrega una entrada, reemplazando la menos usada si está lleno."""
+        vec = self._normalize(vector)
+
+        with self._lock:
+            self._clock += 1
+
+            if self._vecs is None:
+                self._vecs = vec[np.newaxis, :]
+                self._values = [value]
+                self._last_used = [self._clock]
+            elif len(self._values) >= self.maxsize:
+                oldest = int(np.argmin(self._last_used))
+                self._vecs[oldest] = vec
+                self._values[oldest] = value
+                self._last_used[oldest] = self._clock
+            else:
+                self._vecs = np.vstack([self._vecs, vec])
+                self._values.append(value)
+                self._last_used.append(self._clock)
+
+    def clear(self):
+        """Vacía el cache."""
+        with self._lock:
+            self._vecs = None
+            self._values = []
+            self._last_used = []
+
+    def __len__(self) -> int:
+        return len(self._values)
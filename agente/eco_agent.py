@@ -13,15 +13,21 @@ Fecha: 2024
 """
 
 import os
-import json
+import re
+import queue
+import atexit
+import asyncio
+import functools
 import logging
+import threading
+import weakref
+import orjson
+from collections import Counter
+from types import MappingProxyType
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, ClassVar, Iterator, List, Optional
 
-# Importaciones de LangChain
-from langchain.agents import initialize_agent, AgentType, Tool
-from langchain_openai import ChatOpenAI
-from langchain_community.llms import OpenAI
+# Importaciones de LangChain (ligeras; el resto se importa al usarse)
 from langchain.schema import AgentAction, AgentFinish
 from langchain.callbacks.base import BaseCallbackHandler
 
@@ -31,7 +37,10 @@ from .tools import (
     generar_etiqueta_devolucion,
     consultar_politicas_devolucion
 )
-from .rag_pipeline import EcoRAGPipeline, create_rag_pipeline
+from .planner import (
+    LLMCompilerAgent, acall_llm, aiter_shared, astream_llm, iter_sync, make_async, run_shared, run_sync
+)
+from .cache import TTLCache, SemanticCache, normalize_query, query_hash
 
 # Configurar logging
 logging.basicConfig(
@@ -40,30 +49,141 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Tokens que hacen que la respuesta dependa de datos concretos (no cacheable)
+DYNAMIC_TOKENS_PATTERN = re.compile(r"\b(?:PROD|CLI)\d+\b|\d{4}-\d{2}-\d{2}", re.IGNORECASE)
+
+# Patrones para lanzar herramientas de forma especulativa
+PRODUCT_ID_PATTERN = re.compile(r"\bPROD\d+\b")
+DATE_PATTERN = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+
+# Clasificación rápida de intención (consultas que no necesitan planificación)
+ACTION_INTENT_PATTERN = re.compile(
+    r"etiqueta|elegib|puedo devolver|\b(?:PROD|CLI)\d+\b|\d{4}-\d{2}-\d{2}", re.IGNORECASE
+)
+GREETING_INTENT_PATTERN = re.compile(
+    r"^\W*(?:hola|buen[oa]s(?: días| tardes| noches)?|gracias|hey)\W*$", re.IGNORECASE
+)
+INFO_INTENT_PATTERN = re.compile(
+    r"\b(?:pol[ií]ticas?|c[oó]mo|qu[eé] es|cu[aá]les|cu[aá]nto tiempo)\b", re.IGNORECASE
+)
+
+# Categoría de políticas mencionada en una consulta informativa
+CATEGORY_PATTERNS = (
+    ("Tablets", re.compile(r"\btablets?\b|\bipad", re.IGNORECASE)),
+    ("Computadoras", re.compile(r"computador|laptop|port[aá]til|desktop", re.IGNORECASE)),
+    ("Audio", re.compile(r"audio|auricular|altavo|parlante|sonido", re.IGNORECASE)),
+    ("Electrónicos", re.compile(r"electr[oó]nic|smartphone|celular|tel[eé]fono|m[oó]vil", re.IGNORECASE)),
+)
+
+# Descripciones de las herramientas
+_DESC_ELEGIBILIDAD = (
+    "Verifica si un producto puede devolverse según su ID y fecha de compra.\n"
+    "Parámetros: producto_id (string), fecha_compra (string en formato YYYY-MM-DD)\n"
+    "Ejemplo: Verificar Elegibilidad de Producto PROD001 2024-10-01"
+)
+_DESC_ETIQUETA = (
+    "Genera una etiqueta de devolución para un producto y cliente específicos.\n"
+    "Parámetros: producto_id (string), cliente_id (string)\n"
+    "Ejemplo: Generar Etiqueta de Devolución PROD001 CLI001"
+)
+_DESC_POLITICAS = (
+    "Consulta las políticas de devolución según la categoría del producto.\n"
+    "Parámetros: categoria (string opcional)\n"
+    "Ejemplo: Consultar Políticas de Devolución Electrónicos"
+)
+_DESC_RAG = (
+    "Consulta información general sobre políticas, procedimientos y datos de la empresa.\n"
+    "Parámetros: query (string)\n"
+    "Ejemplo: Consulta RAG ¿Cuáles son los procedimientos de calidad?"
+)
+
+
+# Loggers con el archivo abierto; se cierran al salir sin mantenerlos vivos
+_OPEN_LOGGERS: "weakref.WeakSet[EcoAgentLogger]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_loggers():
+    """Vacía y cierra los loggers que sigan abiertos al terminar el proceso."""
+    for agent_logger in list(_OPEN_LOGGERS):
+        agent_logger.close()
+
+
+@functools.lru_cache(maxsize=1)
+def _static_tools() -> tuple:
+    """Construye una sola vez las herramientas que no dependen de la instancia."""
+    from langchain.agents import Tool
+    
+    return (
+        Tool.from_function(
+            name="Verificar Elegibilidad de Producto",
+            func=verificar_elegibilidad_producto,
+            coroutine=make_async(verificar_elegibilidad_producto),
+            description=_DESC_ELEGIBILIDAD
+        ),
+        Tool.from_function(
+            name="Generar Etiqueta de Devolución",
+            func=generar_etiqueta_devolucion,
+            coroutine=make_async(generar_etiqueta_devolucion),
+            description=_DESC_ETIQUETA
+        ),
+        Tool.from_function(
+            name="Consultar Políticas de Devolución",
+            func=consultar_politicas_devolucion,
+            coroutine=make_async(consultar_politicas_devolucion),
+            description=_DESC_POLITICAS
+        )
+    )
+
 
 class EcoAgentLogger(BaseCallbackHandler):
-    """Callback handler personalizado para logging del agente."""
+    """
+    Callback handler personalizado para logging del agente.
+    
+    Los callbacks solo encolan la entrada; un hilo en segundo plano mantiene
+    el archivo abierto y escribe cada lote con una sola llamada `os.writev`
+    (o un buffer de 64 KiB en plataformas sin `writev`).
+    """
     
-    def __init__(self, log_file: str = "logs/interacciones.log"):
+    _STOP = object()
+    
+    def __init__(self, log_file: str = "logs/interacciones.log",
+                 flush_every: int = 64, flush_interval: float = 0.01,
+                 counter: Optional[Counter] = None):
         """
         Inicializar el logger del agente.
         
         Args:
             log_file (str): Archivo donde guardar los logs
+            flush_every (int): Número máximo de entradas por lote
+            flush_interval (float): Segundos máximos que un lote espera antes de escribirse
+            counter (Counter): Contador compartido de uso por herramienta
         """
         self.log_file = log_file
+        self._counter = counter if counter is not None else Counter()
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._log_dir_ready = False
         self.ensure_log_directory()
+        
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run_writer, name="EcoAgentLogger", daemon=True)
+        self._worker.start()
+        _OPEN_LOGGERS.add(self)
     
     def ensure_log_directory(self):
         """Asegura que el directorio de logs existe."""
-        log_dir = os.path.dirname(self.log_file)
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir)
+        if self._log_dir_ready:
+            return
+        os.makedirs(os.path.dirname(self.log_file) or ".", exist_ok=True)
+        self._log_dir_ready = True
     
     def on_agent_action(self, action: AgentAction, **kwargs):
         """Callback cuando el agente ejecuta una acción."""
+        self._counter[action.tool] += 1
         log_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(),
             "type": "agent_action",
             "tool": action.tool,
             "tool_input": action.tool_input,
@@ -74,7 +194,7 @@ class EcoAgentLogger(BaseCallbackHandler):
     def on_agent_finish(self, finish: AgentFinish, **kwargs):
         """Callback cuando el agente termina."""
         log_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(),
             "type": "agent_finish",
             "output": finish.return_values.get("output", ""),
             "log": finish.log
@@ -82,12 +202,113 @@ class EcoAgentLogger(BaseCallbackHandler):
         self._write_log(log_entry)
     
     def _write_log(self, log_entry: Dict[str, Any]):
-        """Escribe una entrada de log al archivo."""
+        """Encola una entrada de log para el hilo escritor."""
+        if not self._closed:
+            self._queue.put(log_entry)
+    
+    def _run_writer(self):
+        """Consume la cola y escribe las entradas en el archivo por lotes."""
         try:
-            with open(self.log_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            write_batch, close_file = self._open_log_file()
+        except Exception as e:
+            logger.error(f"Error al abrir archivo de log: {e}")
+            self._closed = True
+            return
+        
+        batch = []
+        try:
+            while True:
+                try:
+                    log_entry = self._queue.get(timeout=self.flush_interval if batch else None)
+                except queue.Empty:
+                    self._flush_batch(write_batch, batch)
+                    batch = []
+                    continue
+                
+                if log_entry is self._STOP:
+                    break
+                
+                line = self._serialize(log_entry)
+                if line is not None:
+                    batch.append(line)
+                if len(batch) >= self.flush_every:
+                    self._flush_batch(write_batch, batch)
+                    batch = []
+            
+            self._flush_batch(write_batch, batch)
+        finally:
+            try:
+                close_file()
+            except OSError as e:
+                logger.error(f"Error al cerrar archivo de log: {e}")
+    
+    @staticmethod
+    def _serialize(log_entry: Dict[str, Any]) -> Optional[bytes]:
+        """
+        Serializa una entrada de log como una línea JSON.
+        
+        Los valores que JSON no admite se guardan como texto, de modo que una
+        entrada problemática no descarta el resto del lote.
+        
+        Args:
+            log_entry (Dict[str, Any]): Entrada a serializar
+            
+        Returns:
+            Optional[bytes]: Línea serializada, o None si no se pudo serializar
+        """
+        try:
+            return orjson.dumps(log_entry, default=str, option=orjson.OPT_APPEND_NEWLINE)
+        except Exception as e:
+            logger.error(f"Error al serializar entrada de log: {e}")
+            return None
+    
+    @staticmethod
+    def _flush_batch(write_batch, batch: List[bytes]):
+        """Escribe un lote; los errores se registran sin detener el hilo escritor."""
+        if not batch:
+            return
+        try:
+            write_batch(batch)
         except Exception as e:
             logger.error(f"Error al escribir log: {e}")
+    
+    def _open_log_file(self):
+        """
+        Abre el archivo de log.
+        
+        Returns:
+            Tuple[Callable, Callable]: Funciones para escribir un lote y cerrar el archivo
+        """
+        if not hasattr(os, "writev"):
+            f = open(self.log_file, "ab", buffering=64 * 1024)
+            
+            def write_batch(batch):
+                f.writelines(batch)
+                f.flush()
+            
+            return write_batch, f.close
+        
+        fd = os.open(self.log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        
+        def write_batch(batch):
+            written = os.writev(fd, batch)
+            total = sum(map(len, batch))
+            if written < total:
+                # Escritura parcial: completar el resto
+                data = b"".join(batch)
+                while written < total:
+                    written += os.write(fd, data[written:])
+        
+        return write_batch, lambda: os.close(fd)
+    
+    def close(self):
+        """Vacía la cola pendiente y cierra el archivo de log."""
+        if self._closed:
+            return
+        self._closed = True
+        _OPEN_LOGGERS.discard(self)
+        self._queue.put(self._STOP)
+        self._worker.join(timeout=5)
 
 
 class EcoAgent:
@@ -98,31 +319,79 @@ class EcoAgent:
     para proporcionar asistencia completa en procesos de devolución.
     """
     
-    def __init__(self, openai_api_key: str = None, model_name: str = "gpt-4o-mini"):
+    # Prompt contextual estático; solo la consulta del usuario varía
+    _CTX_TEMPLATE: ClassVar[str] = """
+Eres EcoAgent, un asistente inteligente especializado en devoluciones de productos.
+
+CONTEXTO:
+- Trabajas para EcoTech, una empresa eco-friendly
+- Tienes acceso a herramientas para verificar elegibilidad y generar etiquetas
+- Puedes consultar políticas y procedimientos usando RAG
+- Siempre eres amable, profesional y útil
+
+HERRAMIENTAS DISPONIBLES:
+1. Verificar Elegibilidad de Producto: Para verificar si un producto puede devolverse
+2. Generar Etiqueta de Devolución: Para crear etiquetas de devolución
+3. Consultar Políticas de Devolución: Para obtener información sobre políticas
+4. Consulta RAG: Para consultas generales sobre la empresa
+
+INSTRUCCIONES:
+- Responde de manera clara y profesional
+- Usa las herramientas cuando sea apropiado
+- Si el usuario pregunta sobre devoluciones, verifica elegibilidad primero
+- Si necesita una etiqueta, genera una después de verificar elegibilidad
+- Siempre explica el proceso paso a paso
+
+CONSULTA DEL USUARIO: """
+    _CTX_SUFFIX: ClassVar[str] = """
+
+Responde de manera útil y profesional:
+"""
+    
+    def __init__(self, openai_api_key: str = None, model_name: str = "gpt-4o-mini",
+                 temperature: float = 0.1):
         """
         Inicializar el EcoAgent.
         
         Args:
             openai_api_key (str): Clave API de OpenAI
             model_name (str): Nombre del modelo a utilizar
+            temperature (float): Temperatura del LLM del agente y del pipeline RAG
         """
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         self.model_name = model_name
+        self.temperature = temperature
         self.use_simulated_model = not bool(self.openai_api_key)
         
         # Inicializar componentes
         self.rag_pipeline = None
         self.tools = []
         self.agent = None
-        self.logger = EcoAgentLogger()
         
-        # Estadísticas del agente
+        # Estadísticas del agente (las respuestas exponen una vista de solo lectura)
         self.stats = {
             "total_interactions": 0,
-            "tools_used": {},
+            "tools_used": Counter(),
             "successful_interactions": 0,
             "errors": 0
         }
+        self._stats_view = MappingProxyType(self.stats)
+        
+        # El logger cuenta el uso de herramientas al observar cada acción
+        self.logger = EcoAgentLogger(counter=self.stats["tools_used"])
+        # Si el agente se descarta sin close(), su logger se cierra igualmente
+        self._finalizer = weakref.finalize(self, self.logger.close)
+        
+        # Cache de respuestas: exacta (hash) y semántica (embeddings)
+        self._exact_cache = TTLCache(maxsize=1024, ttl=3600)
+        self._semantic_cache = SemanticCache(threshold=0.95, maxsize=1024)
+        
+        # Cache de resultados de la herramienta RAG (30 minutos)
+        self._rag_cache = TTLCache(maxsize=512, ttl=1800)
+        
+        # Consultas idénticas en curso (single-flight)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._inflight_lock = threading.Lock()
         
         logger.info("EcoAgent inicializado")
     
@@ -130,7 +399,10 @@ class EcoAgent:
         """Inicializa el pipeline RAG."""
         try:
             logger.info("Inicializando pipeline RAG...")
-            self.rag_pipeline = create_rag_pipeline(self.openai_api_key)
+            from .rag_pipeline import create_rag_pipeline
+            
+            self.rag_pipeline = create_rag_pipeline(self.openai_api_key, temperature=self.temperature)
+            self._rag_cache.clear()
             logger.info("Pipeline RAG inicializado exitosamente")
         except Exception as e:
             logger.error(f"Error al inicializar pipeline RAG: {e}")
@@ -140,45 +412,16 @@ class EcoAgent:
         """Crea las herramientas disponibles para el agente."""
         try:
             logger.info("Creando herramientas del agente...")
+            from langchain.agents import Tool
             
-            # Herramienta RAG para consultas generales
-            def rag_query(query: str) -> str:
-                """Consulta información usando el pipeline RAG."""
-                try:
-                    result = self.rag_pipeline.query(query)
-                    return result.get("result", "No se pudo obtener información.")
-                except Exception as e:
-                    return f"Error en consulta RAG: {str(e)}"
-            
-            # Definir herramientas
+            # Las herramientas estáticas se comparten; solo la RAG depende de la instancia
             self.tools = [
-                Tool(
-                    name="Verificar Elegibilidad de Producto",
-                    func=verificar_elegibilidad_producto,
-                    description="""Verifica si un producto puede devolverse según su ID y fecha de compra.
-                    Parámetros: producto_id (string), fecha_compra (string en formato YYYY-MM-DD)
-                    Ejemplo: Verificar Elegibilidad de Producto PROD001 2024-10-01"""
-                ),
-                Tool(
-                    name="Generar Etiqueta de Devolución",
-                    func=generar_etiqueta_devolucion,
-                    description="""Genera una etiqueta de devolución para un producto y cliente específicos.
-                    Parámetros: producto_id (string), cliente_id (string)
-                    Ejemplo: Generar Etiqueta de Devolución PROD001 CLI001"""
-                ),
-                Tool(
-                    name="Consultar Políticas de Devolución",
-                    func=consultar_politicas_devolucion,
-                    description="""Consulta las políticas de devolución según la categoría del producto.
-                    Parámetros: categoria (string opcional)
-                    Ejemplo: Consultar Políticas de Devolución Electrónicos"""
-                ),
-                Tool(
+                *_static_tools(),
+                Tool.from_function(
                     name="Consulta RAG",
-                    func=rag_query,
-                    description="""Consulta información general sobre políticas, procedimientos y datos de la empresa.
-                    Parámetros: query (string)
-                    Ejemplo: Consulta RAG ¿Cuáles son los procedimientos de calidad?"""
+                    func=self._rag_query,
+                    coroutine=make_async(self._rag_query),
+                    description=_DESC_RAG
                 )
             ]
             
@@ -188,14 +431,34 @@ class EcoAgent:
             logger.error(f"Error al crear herramientas: {e}")
             raise
     
+    def _rag_query(self, query: str) -> str:
+        """Consulta información usando el pipeline RAG."""
+        try:
+            cache_key = query_hash(query)
+            cached = self._rag_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            result = self.rag_pipeline.query(query)
+            answer = result.get("result", "No se pudo obtener información.")
+            # Solo se guardan respuestas válidas: los errores deben reintentarse
+            if result.get("status") == "success":
+                self._rag_cache.set(cache_key, answer)
+            return answer
+        except Exception as e:
+            return f"Error en consulta RAG: {str(e)}"
+    
     def initialize_llm(self):
         """Inicializa el modelo de lenguaje."""
         try:
             if not self.use_simulated_model:
+                from langchain_openai import ChatOpenAI
+                
                 self.llm = ChatOpenAI(
                     model_name=self.model_name,
                     openai_api_key=self.openai_api_key,
-                    temperature=0.1
+                    temperature=self.temperature,
+                    streaming=True
                 )
                 logger.info(f"LLM inicializado: {self.model_name}")
             else:
@@ -211,38 +474,51 @@ class EcoAgent:
     def _create_simulated_llm(self):
         """Crea un LLM simulado para pruebas."""
         class SimulatedLLM:
+            # Una sola pasada de regex sobre el prompt en lugar de un `in` por regla
+            _PATTERN = re.compile(
+                r"(?P<devolucion>devoluci[oó]n)|(?P<politica>pol[ií]tica)|(?P<soporte>ayuda|soporte)",
+                re.IGNORECASE
+            )
+            _PRIORITY = ("devolucion", "politica", "soporte")
+            _RESPONSES = {
+                "devolucion": "Para procesar una devolución, puedo ayudarte verificando la elegibilidad del producto y generando una etiqueta de devolución.",
+                "politica": "Las políticas de devolución varían según la categoría. Puedo consultar las políticas específicas para ti.",
+                "soporte": "Soy EcoAgent, tu asistente especializado en devoluciones. ¿En qué puedo ayudarte?"
+            }
+            _DEFAULT = "Soy EcoAgent. Puedo ayudarte con devoluciones, políticas y procedimientos. ¿Qué necesitas?"
+            
             def __init__(self):
                 self.name = "SimulatedLLM"
             
             def __call__(self, prompt: str) -> str:
-                """Simula respuesta del LLM."""
-                prompt_lower = prompt.lower()
+                """Simula respuesta del LLM (con los resultados de las herramientas, si los hay)."""
+                prompt, _, results = prompt.partition(LLMCompilerAgent.RESULTS_HEADER)
+                matched = {m.lastgroup for m in self._PATTERN.finditer(prompt)}
                 
-                if "devolución" in prompt_lower:
-                    return "Para procesar una devolución, puedo ayudarte verificando la elegibilidad del producto y generando una etiqueta de devolución."
-                elif "política" in prompt_lower:
-                    return "Las políticas de devolución varían según la categoría. Puedo consultar las políticas específicas para ti."
-                elif "ayuda" in prompt_lower or "soporte" in prompt_lower:
-                    return "Soy EcoAgent, tu asistente especializado en devoluciones. ¿En qué puedo ayudarte?"
-                else:
-                    return "Soy EcoAgent. Puedo ayudarte con devoluciones, políticas y procedimientos. ¿Qué necesitas?"
+                answer = next((self._RESPONSES[intent] for intent in self._PRIORITY if intent in matched), self._DEFAULT)
+                if results.strip():
+                    return f"{answer}\n\n{results.strip()}"
+                return answer
         
         return SimulatedLLM()
     
     def create_agent(self):
-        """Crea el agente principal con LangChain."""
+        """
+        Crea el agente principal.
+        
+        Usa un planificador estilo LLMCompiler: el LLM emite un DAG de llamadas
+        a herramientas y los nodos independientes se ejecutan en paralelo.
+        """
         try:
             logger.info("Creando agente principal...")
             
             # Crear el agente
-            self.agent = initialize_agent(
-                tools=self.tools,
+            self.agent = LLMCompilerAgent(
                 llm=self.llm,
-                agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-                verbose=True,
-                handle_parsing_errors=True,
+                tools=self.tools,
+                callbacks=[self.logger],
                 max_iterations=5,
-                early_stopping_method="generate"
+                verbose=True
             )
             
             logger.info("Agente principal creado exitosamente")
@@ -284,20 +560,59 @@ class EcoAgent:
         Returns:
             Dict[str, Any]: Respuesta del agente y metadatos
         """
+        return run_sync(self._aprocess_query(user_input))
+    
+    async def aprocess_query(self, user_input: str) -> Dict[str, Any]:
+        """
+        Procesa una consulta del usuario de forma asíncrona.
+        
+        Permite que un servidor async (FastAPI/Uvicorn) intercale muchas
+        consultas en curso sin bloquear un hilo por consulta. La consulta se
+        ejecuta en el loop compartido del agente, donde viven sus clientes async.
+        
+        Args:
+            user_input (str): Consulta del usuario
+            
+        Returns:
+            Dict[str, Any]: Respuesta del agente y metadatos
+        """
+        return await run_shared(self._aprocess_query(user_input))
+    
+    async def _aprocess_query(self, user_input: str) -> Dict[str, Any]:
+        """Implementación de aprocess_query (se ejecuta en el loop compartido)."""
         try:
             logger.info(f"Procesando consulta: {user_input}")
             
             # Actualizar estadísticas
             self.stats["total_interactions"] += 1
             
-            # Crear prompt contextual
-            contextual_prompt = self._create_contextual_prompt(user_input)
+            # Consultar cache de respuestas
+            cache_key, query_vector = None, None
+            if not DYNAMIC_TOKENS_PATTERN.search(user_input):
+                cache_key = query_hash(user_input)
+                cached = self._exact_cache.get(cache_key)
+                
+                if cached is None:
+                    query_vector = await self._aembed_query(user_input)
+                    if query_vector is not None:
+                        cached = self._semantic_cache.lookup(query_vector)
+                
+                if cached is not None:
+                    logger.info("Respuesta obtenida desde cache")
+                    self.stats["successful_interactions"] += 1
+                    return {
+                        **cached,
+                        "timestamp": datetime.now().isoformat(),
+                        "user_input": user_input,
+                        "cache_hit": True,
+                        "stats": self._stats_view
+                    }
             
-            # Ejecutar agente
-            if self.agent:
-                response = self.agent.run(contextual_prompt)
+            # Ejecutar agente (las consultas idénticas en curso se comparten)
+            if cache_key is not None:
+                response, is_owner = await self._arun_coalesced(cache_key, user_input)
             else:
-                response = "Lo siento, el agente no está disponible en este momento."
+                response, is_owner = await self._arun_agent(user_input), True
             
             # Registrar interacción exitosa
             self.stats["successful_interactions"] += 1
@@ -309,9 +624,15 @@ class EcoAgent:
                 "user_input": user_input,
                 "agent_status": "success",
                 "tools_available": len(self.tools),
-                "stats": self.stats.copy()
+                "stats": self._stats_view
             }
             
+            # Guardar en cache (solo quien ejecutó el agente)
+            if cache_key is not None and is_owner:
+                self._exact_cache.set(cache_key, result)
+                if query_vector is not None:
+                    self._semantic_cache.add(query_vector, result)
+            
             logger.info("Consulta procesada exitosamente")
             return result
             
@@ -325,38 +646,239 @@ class EcoAgent:
                 "user_input": user_input,
                 "agent_status": "error",
                 "error": str(e),
-                "stats": self.stats.copy()
+                "stats": self._stats_view
             }
     
+    def process_queries_batch(self, queries: List[str], max_concurrency: int = 8) -> List[Dict[str, Any]]:
+        """
+        Versión síncrona de process_queries: envía todas las consultas a la vez.
+        
+        Args:
+            queries (List[str]): Consultas del usuario
+            max_concurrency (int): Máximo de consultas simultáneas
+            
+        Returns:
+            List[Dict[str, Any]]: Resultados en el mismo orden que las consultas
+        """
+        return run_sync(self._aprocess_queries(queries, max_concurrency))
+    
+    async def process_queries(self, queries: List[str], max_concurrency: int = 8) -> List[Dict[str, Any]]:
+        """
+        Procesa varias consultas de forma concurrente.
+        
+        Las consultas comparten el cliente HTTP del LLM, por lo que el costo
+        de conexión se amortiza en todo el lote.
+        
+        Args:
+            queries (List[str]): Consultas del usuario
+            max_concurrency (int): Máximo de consultas simultáneas
+            
+        Returns:
+            List[Dict[str, Any]]: Resultados en el mismo orden que las consultas
+        """
+        return await run_shared(self._aprocess_queries(queries, max_concurrency))
+    
+    async def _aprocess_queries(self, queries: List[str], max_concurrency: int) -> List[Dict[str, Any]]:
+        """Implementación de process_queries (se ejecuta en el loop compartido)."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def bounded_query(query: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._aprocess_query(query)
+        
+        return await asyncio.gather(*(bounded_query(query) for query in queries))
+    
+    async def _arun_agent(self, user_input: str) -> str:
+        """Ejecuta el agente sobre el prompt contextual de la consulta."""
+        if not self.agent:
+            return "Lo siento, el agente no está disponible en este momento."
+        
+        contextual_prompt = self._create_contextual_prompt(user_input)
+        intent = self._classify(user_input)
+        
+        # Saludos: una sola llamada al LLM, sin herramientas
+        if intent == "GREETING":
+            return await acall_llm(self.llm, contextual_prompt)
+        
+        # Consultas informativas: plan fijo de consulta, sin llamada al planificador
+        if intent == "INFO":
+            return await self.agent.arun(contextual_prompt, plan=self._grounding_plan(user_input))
+        
+        return await self.agent.arun(contextual_prompt, speculative=self._speculate(user_input))
+    
+    async def _arun_coalesced(self, cache_key: str, user_input: str):
+        """
+        Ejecuta el agente una sola vez por consulta idéntica en curso.
+        
+        Returns:
+            Tuple[str, bool]: Respuesta y si esta llamada ejecutó el agente
+        """
+        loop = asyncio.get_running_loop()
+        
+        with self._inflight_lock:
+            future = self._inflight.get(cache_key)
+            # Solo se puede esperar un Future del mismo event loop
+            is_owner = future is None or future.get_loop() is not loop
+            if is_owner:
+                future = loop.create_future()
+                self._inflight.setdefault(cache_key, future)
+        
+        if not is_owner:
+            logger.info("Consulta idéntica en curso; reutilizando su resultado")
+            return await asyncio.shield(future), False
+        
+        try:
+            response = await self._arun_agent(user_input)
+            future.set_result(response)
+            return response, True
+        except BaseException as e:
+            future.set_exception(e)
+            # Marcar la excepción como recuperada aunque nadie más espere
+            future.exception()
+            raise
+        finally:
+            with self._inflight_lock:
+                if self._inflight.get(cache_key) is future:
+                    del self._inflight[cache_key]
+    
+    def stream_query(self, user_input: str, with_status: bool = False) -> Iterator[Any]:
+        """
+        Versión síncrona de astream_query (p. ej. para st.write_stream).
+        
+        Args:
+            user_input (str): Consulta del usuario
+            with_status (bool): Emitir al final un dict con el estado de la consulta
+            
+        Yields:
+            str: Fragmentos de la respuesta final (y el dict de estado, si se pidió)
+        """
+        return iter_sync(self._astream_query(user_input, with_status))
+    
+    def astream_query(self, user_input: str, with_status: bool = False) -> AsyncIterator[Any]:
+        """
+        Procesa una consulta emitiendo la respuesta final a medida que se genera.
+        
+        Args:
+            user_input (str): Consulta del usuario
+            with_status (bool): Emitir como último elemento un dict con
+                "agent_status", "stats" y, si hubo un fallo, "error"
+            
+        Yields:
+            str: Fragmentos de la respuesta final (y el dict de estado, si se pidió)
+        """
+        return aiter_shared(self._astream_query(user_input, with_status))
+    
+    async def _astream_query(self, user_input: str, with_status: bool = False) -> AsyncIterator[Any]:
+        """Implementación de astream_query (se ejecuta en el loop compartido)."""
+        status = {"agent_status": "success"}
+        try:
+            logger.info(f"Procesando consulta en streaming: {user_input}")
+            self.stats["total_interactions"] += 1
+            
+            if not self.agent:
+                yield "Lo siento, el agente no está disponible en este momento."
+            else:
+                contextual_prompt = self._create_contextual_prompt(user_input)
+                intent = self._classify(user_input)
+                if intent == "GREETING":
+                    tokens = astream_llm(self.llm, contextual_prompt)
+                elif intent == "INFO":
+                    tokens = self.agent.astream(contextual_prompt, plan=self._grounding_plan(user_input))
+                else:
+                    tokens = self.agent.astream(contextual_prompt, speculative=self._speculate(user_input))
+                
+                async for token in tokens:
+                    yield token
+            
+            self.stats["successful_interactions"] += 1
+            
+        except Exception as e:
+            logger.error(f"Error al procesar consulta en streaming: {e}")
+            self.stats["errors"] += 1
+            status = {"agent_status": "error", "error": str(e)}
+            yield f"Lo siento, ocurrió un error al procesar tu consulta: {str(e)}"
+        
+        if with_status:
+            yield {**status, "stats": self._stats_view}
+    
+    @staticmethod
+    def _classify(user_input: str) -> str:
+        """
+        Clasifica la intención de la consulta con expresiones regulares.
+        
+        Returns:
+            str: "GREETING", "INFO" o "ACTION" (requiere herramientas)
+        """
+        if ACTION_INTENT_PATTERN.search(user_input):
+            return "ACTION"
+        if GREETING_INTENT_PATTERN.match(user_input):
+            return "GREETING"
+        if INFO_INTENT_PATTERN.search(user_input):
+            return "INFO"
+        return "ACTION"
+    
+    @staticmethod
+    def _grounding_plan(user_input: str) -> List[Dict[str, Any]]:
+        """
+        Plan fijo para consultas informativas.
+        
+        Consulta en paralelo las políticas (de la categoría mencionada, si hay
+        alguna) y el pipeline RAG, para que la respuesta se base en datos.
+        
+        Args:
+            user_input (str): Consulta del usuario
+            
+        Returns:
+            List[Dict[str, Any]]: Nodos del plan en el formato del planificador
+        """
+        categoria = next((name for name, pattern in CATEGORY_PATTERNS if pattern.search(user_input)), None)
+        return [
+            {"id": 1, "tool": "Consultar Políticas de Devolución", "args": [categoria] if categoria else []},
+            {"id": 2, "tool": "Consulta RAG", "args": [user_input]},
+        ]
+    
+    def _speculate(self, user_input: str) -> Dict[tuple, asyncio.Task]:
+        """
+        Lanza por adelantado las herramientas que la consulta casi seguro necesita.
+        
+        Se ejecutan mientras el LLM planifica; si el plan no las usa,
+        el agente las cancela.
+        """
+        speculative = {}
+        
+        product_match = PRODUCT_ID_PATTERN.search(user_input)
+        date_match = DATE_PATTERN.search(user_input)
+        if product_match and date_match:
+            args = (product_match.group(), date_match.group())
+            speculative[("Verificar Elegibilidad de Producto", args)] = asyncio.create_task(
+                make_async(verificar_elegibilidad_producto)(*args)
+            )
+        
+        return speculative
+    
+    async def _aembed_query(self, user_input: str) -> Optional[List[float]]:
+        """Calcula el embedding de la consulta si hay embeddings disponibles."""
+        if self.rag_pipeline is None:
+            return None
+        
+        embeddings = await self.rag_pipeline.aget_embeddings()
+        if embeddings is None:
+            return None
+        
+        try:
+            return await embeddings.aembed_query(normalize_query(user_input))
+        except Exception as e:
+            logger.warning(f"No se pudo calcular embedding para cache: {e}")
+            return None
+    
     def _create_contextual_prompt(self, user_input: str) -> str:
-        """Crea un prompt contextual para el agente."""
-        context = f"""
-Eres EcoAgent, un asistente inteligente especializado en devoluciones de productos.
-
-CONTEXTO:
-- Trabajas para EcoTech, una empresa eco-friendly
-- Tienes acceso a herramientas para verificar elegibilidad y generar etiquetas
-- Puedes consultar políticas y procedimientos usando RAG
-- Siempre eres amable, profesional y útil
-
-HERRAMIENTAS DISPONIBLES:
-1. Verificar Elegibilidad de Producto: Para verificar si un producto puede devolverse
-2. Generar Etiqueta de Devolución: Para crear etiquetas de devolución
-3. Consultar Políticas de Devolución: Para obtener información sobre políticas
-4. Consulta RAG: Para consultas generales sobre la empresa
-
-INSTRUCCIONES:
-- Responde de manera clara y profesional
-- Usa las herramientas cuando sea apropiado
-- Si el usuario pregunta sobre devoluciones, verifica elegibilidad primero
-- Si necesita una etiqueta, genera una después de verificar elegibilidad
-- Siempre explica el proceso paso a paso
-
-CONSULTA DEL USUARIO: {user_input}
-
-Responde de manera útil y profesional:
-"""
-        return context
+        """
+        Crea un prompt contextual para el agente.
+        
+        El contexto estático va primero y es idéntico en todas las consultas,
+        lo que permite aprovechar el cache de prefijos del proveedor del LLM.
+        """
+        return self._CTX_TEMPLATE + user_input + self._CTX_SUFFIX
     
     def get_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas del agente."""
@@ -369,29 +891,40 @@ Responde de manera útil y profesional:
             "model_type": "simulated" if self.use_simulated_model else "openai"
         }
     
+    def close(self):
+        """Libera los recursos del agente (hilo y archivo del logger)."""
+        self._finalizer()
+    
+    def stats_snapshot(self) -> Dict[str, Any]:
+        """
+        Copia serializable (JSON/pickle) de las estadísticas actuales.
+        
+        Las respuestas solo llevan la vista de solo lectura; la copia se hace
+        donde el resultado sale del proceso o se guarda.
+        """
+        return {**self.stats, "tools_used": dict(self.stats["tools_used"])}
+    
     def reset_stats(self):
         """Reinicia las estadísticas del agente."""
-        self.stats = {
-            "total_interactions": 0,
-            "tools_used": {},
-            "successful_interactions": 0,
-            "errors": 0
-        }
+        # Se modifican en el mismo dict para que la vista siga siendo válida
+        self.stats.update(total_interactions=0, successful_interactions=0, errors=0)
+        self.stats["tools_used"].clear()
         logger.info("Estadísticas reiniciadas")
 
 
 # Función de conveniencia para crear el agente
-def create_eco_agent(openai_api_key: str = None) -> EcoAgent:
+def create_eco_agent(openai_api_key: str = None, temperature: float = 0.1) -> EcoAgent:
     """
     Crea e inicializa un EcoAgent completo.
     
     Args:
         openai_api_key (str): Clave API de OpenAI
+        temperature (float): Temperatura del LLM
         
     Returns:
         EcoAgent: Agente inicializado
     """
-    agent = EcoAgent(openai_api_key)
+    agent = EcoAgent(openai_api_key, temperature=temperature)
     agent.initialize_agent()
     return agent
 
@@ -411,9 +944,10 @@ if __name__ == "__main__":
         "¿Cómo funciona el proceso de devolución?"
     ]
     
-    for query in test_queries:
+    results = asyncio.run(agent.process_queries(test_queries))
+    
+    for query, result in zip(test_queries, results):
         print(f"\n❓ Consulta: {query}")
-        result = agent.process_query(query)
         print(f"✅ Respuesta: {result['response']}")
         print(f"📊 Estado: {result['agent_status']}")
     
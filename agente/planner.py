@@ -0,0 +1,452 @@
+"""
+Planificador y Ejecutor de Herramientas para EcoAgent
+=====================================================
+
+Este módulo implementa un agente estilo LLMCompiler que desacopla la
+planificación de la ejecución:
+- Un LLM planificador emite un DAG de llamadas a herramientas en JSON
+- Un ejecutor lanza en paralelo los nodos cuyas dependencias ya se resolvieron
+- Un LLM final combina las observaciones en la respuesta al usuario
+
+Autor: EcoAgent Team
+Fecha: 2024
+"""
+
+import asyncio
+import json
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+from langchain.schema import AgentAction, AgentFinish
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Event loop compartido (hilo daemon) donde se ejecuta todo el código async del agente
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+_shared_loop_lock = threading.Lock()
+
+
+def shared_loop() -> asyncio.AbstractEventLoop:
+    """
+    Devuelve el event loop de larga vida del agente, creándolo si hace falta.
+
+    Los clientes async de LangChain/OpenAI (pools de conexiones httpx) quedan
+    ligados al loop en el que se usan por primera vez; ejecutar siempre en el
+    mismo loop evita errores "Event loop is closed" entre llamadas.
+    """
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="EcoAgentLoop", daemon=True).start()
+            _shared_loop = loop
+    return _shared_loop
+
+
+def _in_shared_loop() -> bool:
+    """Indica si el hilo actual es el que ejecuta el loop compartido."""
+    try:
+        return asyncio.get_running_loop() is _shared_loop
+    except RuntimeError:
+        return False
+
+
+def run_sync(coro):
+    """
+    Ejecuta una corrutina en el loop compartido desde código síncrono.
+
+    Raises:
+        RuntimeError: Si se llama desde el propio loop compartido (se bloquearía)
+    """
+    if _in_shared_loop():
+        coro.close()
+        raise RuntimeError("run_sync no puede llamarse desde el event loop del agente; usa await")
+
+    return asyncio.run_coroutine_threadsafe(coro, shared_loop()).result()
+
+
+async def run_shared(coro):
+    """Espera una corrutina ejecutándola en el loop compartido (sea cual sea el loop actual)."""
+    if _in_shared_loop():
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, shared_loop()))
+
+
+async def aiter_shared(async_iterator: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """Recorre un generador asíncrono ejecutándolo en el loop compartido."""
+    if _in_shared_loop():
+        async for item in async_iterator:
+            yield item
+        return
+
+    caller = asyncio.get_running_loop()
+    items: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+    future = asyncio.run_coroutine_threadsafe(
+        _consume(async_iterator, lambda entry: caller.call_soon_threadsafe(items.put_nowait, entry)),
+        shared_loop()
+    )
+
+    try:
+        while True:
+            kind, value = await items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        # Si el consumidor deja de iterar, se cancela la generación en curso
+        future.cancel()
+
+
+def iter_sync(async_iterator: AsyncIterator[Any]) -> Iterator[Any]:
+    """
+    Recorre un generador asíncrono desde código síncrono.
+
+    El generador se consume en el loop compartido y cada elemento se entrega
+    en cuanto se produce. Si el consumidor deja de iterar (close() o Ctrl-C),
+    la tarea se cancela, lo que aborta también la llamada en curso al LLM o
+    a las herramientas.
+    """
+    if _in_shared_loop():
+        raise RuntimeError("iter_sync no puede llamarse desde el event loop del agente; usa async for")
+
+    items: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(_consume(async_iterator, items.put), shared_loop())
+
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        future.cancel()
+
+
+async def _consume(async_iterator: AsyncIterator[Any], put) -> None:
+    """Entrega cada elemento del generador como ("item", valor), seguido de ("done", None)."""
+    try:
+        async for item in async_iterator:
+            put(("item", item))
+    except Exception as e:
+        put(("error", e))
+    finally:
+        await async_iterator.aclose()
+        put(("done", None))
+
+
+def make_async(func):
+    """Crea un adaptador async que ejecuta una función síncrona en un hilo."""
+    async def async_func(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    return async_func
+
+
+async def acall_llm(llm, prompt: str) -> str:
+    """Invoca un LLM (LangChain o simulado) y devuelve el texto de la respuesta."""
+    if hasattr(llm, "ainvoke"):
+        response = await llm.ainvoke(prompt)
+    else:
+        response = await asyncio.to_thread(llm, prompt)
+    return getattr(response, "content", response)
+
+
+async def astream_llm(llm, prompt: str) -> AsyncIterator[str]:
+    """Emite la respuesta de un LLM por fragmentos (de una vez si no soporta streaming)."""
+    if hasattr(llm, "astream"):
+        async for chunk in llm.astream(prompt):
+            yield getattr(chunk, "content", chunk)
+    else:
+        yield await acall_llm(llm, prompt)
+
+
+class LLMCompilerAgent:
+    """
+    Agente que planifica un DAG de herramientas y ejecuta los nodos
+    independientes de forma concurrente.
+    """
+
+    PLANNER_INSTRUCTIONS = """
+PLANIFICACIÓN:
+Devuelve ÚNICAMENTE una lista JSON con las llamadas a herramientas necesarias.
+Cada elemento debe tener la forma:
+{"id": 1, "tool": "<nombre exacto de la herramienta>", "args": ["arg1", "arg2"], "deps": []}
+
+- "args" es la lista de argumentos posicionales de la herramienta
+- Usa "$<id>" dentro de un argumento para referirte al resultado de otro nodo
+- "deps" lista los ids de los nodos que deben terminar antes
+- Nodos sin dependencias entre sí se ejecutarán en paralelo
+- Si no se necesita ninguna herramienta, devuelve []
+"""
+
+    # Encabezado de las observaciones en el prompt de la respuesta final
+    RESULTS_HEADER = "RESULTADOS DE LAS HERRAMIENTAS:"
+
+    def __init__(self, llm, tools: List[Any], callbacks: Optional[List[Any]] = None,
+                 max_iterations: int = 5, verbose: bool = False):
+        """
+        Inicializar el agente planificador.
+
+        Args:
+            llm: Modelo de lenguaje (LangChain o simulado)
+            tools (List[Tool]): Herramientas disponibles
+            callbacks (List[BaseCallbackHandler]): Handlers notificados en cada acción
+            max_iterations (int): Máximo de rondas de planificación
+            verbose (bool): Registrar el plan y las observaciones
+        """
+        self.llm = llm
+        self.tools = {tool.name: tool for tool in tools}
+        self.callbacks = callbacks or []
+        self.max_iterations = max_iterations
+        self.verbose = verbose
+
+        # Corrutina de cada herramienta (adaptador en hilo si solo es síncrona)
+        self._async_tools = {
+            name: tool.coroutine or make_async(tool.func)
+            for name, tool in self.tools.items()
+        }
+
+    def run(self, prompt: str) -> str:
+        """Ejecuta el agente de forma síncrona."""
+        return run_sync(self.arun(prompt))
+
+    async def arun(self, prompt: str, speculative: Optional[Dict[Tuple, asyncio.Task]] = None,
+                   plan: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        Planifica, ejecuta las herramientas y genera la respuesta final.
+
+        Args:
+            prompt (str): Prompt contextual con la consulta del usuario
+            speculative (Dict[Tuple, Task]): Llamadas lanzadas por adelantado,
+                indexadas por (nombre de herramienta, argumentos)
+            plan (List[Dict]): Plan fijo para la primera ronda (se omite la
+                llamada al planificador)
+
+        Returns:
+            str: Respuesta final del agente
+        """
+        observations = await self.aexecute(prompt, speculative, plan)
+        answer = await self._acall_llm(self._create_join_prompt(prompt, observations))
+
+        finish = AgentFinish(return_values={"output": answer}, log=answer)
+        for callback in self.callbacks:
+            callback.on_agent_finish(finish)
+
+        return answer
+
+    async def astream(self, prompt: str,
+                      speculative: Optional[Dict[Tuple, asyncio.Task]] = None,
+                      plan: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]:
+        """
+        Igual que arun, pero emite la respuesta final token a token.
+
+        Solo se transmite la llamada final del LLM; la planificación y las
+        herramientas se ejecutan antes del primer token.
+        """
+        observations = await self.aexecute(prompt, speculative, plan)
+        join_prompt = self._create_join_prompt(prompt, observations)
+
+        chunks = []
+        async for token in astream_llm(self.llm, join_prompt):
+            chunks.append(token)
+            yield token
+
+        answer = "".join(chunks)
+        finish = AgentFinish(return_values={"output": answer}, log=answer)
+        for callback in self.callbacks:
+            callback.on_agent_finish(finish)
+
+    async def aexecute(self, prompt: str,
+                       speculative: Optional[Dict[Tuple, asyncio.Task]] = None,
+                       plan: Optional[List[Dict[str, Any]]] = None) -> List[Tuple[Dict[str, Any], str]]:
+        """
+        Ejecuta las rondas de planificación y devuelve las observaciones.
+
+        Si algún nodo falla, el error se devuelve al planificador para que
+        pueda corregir el plan en la siguiente ronda. Las llamadas
+        especulativas que el plan no utilice se cancelan al terminar.
+        Si se indica `plan`, la primera ronda lo ejecuta directamente.
+        """
+        observations = []
+        speculative = speculative if speculative is not None else {}
+
+        try:
+            for iteration in range(self.max_iterations):
+                if iteration > 0 or plan is None:
+                    plan_text = await self._acall_llm(self._create_plan_prompt(prompt, observations))
+                    plan = self._parse_plan(plan_text)
+
+                if self.verbose:
+                    logger.info(f"Plan (ronda {iteration + 1}): {plan}")
+
+                if not plan:
+                    break
+
+                results, errors = await self._aexecute_plan(plan, speculative)
+                observations.extend(results)
+
+                if not errors:
+                    break
+        finally:
+            # Se esperan las canceladas para que ninguna quede corriendo ni con excepciones sin recoger
+            unused = list(speculative.values())
+            speculative.clear()
+            for task in unused:
+                task.cancel()
+            await asyncio.gather(*unused, return_exceptions=True)
+
+        return observations
+
+    async def _aexecute_plan(self, plan: List[Dict[str, Any]],
+                             speculative: Dict[Tuple, asyncio.Task]) -> Tuple[List[Tuple[Dict[str, Any], str]], int]:
+        """Ejecuta un DAG lanzando en paralelo los nodos listos."""
+        pending = {node["id"]: node for node in plan}
+        outputs: Dict[Any, str] = {}
+        results = []
+        errors = 0
+
+        while pending:
+            ready = [node for node in pending.values()
+                     if all(dep in outputs for dep in node.get("deps", []))]
+
+            if not ready:
+                # Dependencias circulares o inexistentes
+                for node in pending.values():
+                    results.append((node, "Error: dependencias no resueltas"))
+                    errors += 1
+                break
+
+            node_results = await asyncio.gather(*(self._arun_node(node, outputs, speculative) for node in ready))
+
+            for node, (output, failed) in zip(ready, node_results):
+                outputs[node["id"]] = output
+                results.append((node, output))
+                errors += failed
+                del pending[node["id"]]
+
+        return results, errors
+
+    async def _arun_node(self, node: Dict[str, Any], outputs: Dict[Any, str],
+                         speculative: Dict[Tuple, asyncio.Task]) -> Tuple[str, bool]:
+        """Ejecuta un nodo del plan, capturando cualquier error."""
+        tool_name = node.get("tool")
+        raw_args = node.get("args", [])
+
+        # Argumentos posicionales (lista) o con nombre (objeto JSON)
+        if isinstance(raw_args, dict):
+            args, kwargs = [], {name: self._resolve_arg(arg, outputs) for name, arg in raw_args.items()}
+        elif isinstance(raw_args, list):
+            args, kwargs = [self._resolve_arg(arg, outputs) for arg in raw_args], {}
+        else:
+            args, kwargs = None, None
+
+        try:
+            if tool_name not in self._async_tools:
+                raise ValueError(f"Herramienta desconocida: {tool_name}")
+            if args is None:
+                raise TypeError(f"'args' debe ser una lista o un objeto JSON, no {type(raw_args).__name__}")
+
+            # AgentAction.tool_input solo admite str o dict: la lista se pasa como JSON
+            tool_input = kwargs or json.dumps(args, ensure_ascii=False, default=str)
+            action = AgentAction(tool=tool_name, tool_input=tool_input, log=json.dumps(node, ensure_ascii=False))
+            for callback in self.callbacks:
+                callback.on_agent_action(action)
+
+            task = None if kwargs else self._pop_speculative(speculative, tool_name, args)
+            if task is not None:
+                output = str(await task)
+            else:
+                output = str(await self._async_tools[tool_name](*args, **kwargs))
+            if self.verbose:
+                logger.info(f"Observación [{tool_name}]: {output[:200]}")
+            return output, False
+
+        except Exception as e:
+            logger.warning(f"Error al ejecutar {tool_name}: {e}")
+            return f"Error en {tool_name}: {str(e)}", True
+
+    @staticmethod
+    def _pop_speculative(speculative: Dict[Tuple, asyncio.Task], tool_name: str,
+                         args: List[Any]) -> Optional[asyncio.Task]:
+        """Obtiene la llamada especulativa que coincide con el nodo, si existe."""
+        try:
+            return speculative.pop((tool_name, tuple(args)), None)
+        except TypeError:
+            # Argumentos no hashables (listas u objetos JSON)
+            return None
+
+    @staticmethod
+    def _resolve_arg(arg: Any, outputs: Dict[Any, str]) -> Any:
+        """Sustituye referencias "$<id>" por el resultado del nodo indicado."""
+        if isinstance(arg, str) and arg.startswith("$"):
+            ref = arg[1:]
+            for key in (ref, int(ref) if ref.isdigit() else None):
+                if key in outputs:
+                    return outputs[key]
+        return arg
+
+    @staticmethod
+    def _parse_plan(plan_text: str) -> List[Dict[str, Any]]:
+        """Extrae la lista JSON del plan; un plan inválido equivale a no usar herramientas."""
+        start, end = plan_text.find("["), plan_text.rfind("]")
+        if start == -1 or end <= start:
+            return []
+
+        try:
+            plan = json.loads(plan_text[start:end + 1])
+        except json.JSONDecodeError as e:
+            logger.warning(f"No se pudo interpretar el plan: {e}")
+            return []
+
+        return [node for node in plan if isinstance(node, dict) and "id" in node and "tool" in node]
+
+    async def _acall_llm(self, prompt: str) -> str:
+        """Invoca el LLM y devuelve el texto de la respuesta."""
+        return await acall_llm(self.llm, prompt)
+
+    def _create_plan_prompt(self, prompt: str, observations: List[Tuple[Dict[str, Any], str]]) -> str:
+        """Crea el prompt del planificador."""
+        tools_text = "\n".join(f"- {tool.name}: {tool.description}" for tool in self.tools.values())
+        plan_prompt = f"{prompt}\nHERRAMIENTAS:\n{tools_text}\n{self.PLANNER_INSTRUCTIONS}"
+
+        if observations:
+            plan_prompt += (
+                "\nRESULTADOS PREVIOS (corrige los errores o devuelve [] si ya es suficiente):\n"
+                f"{self._format_observations(observations)}\n"
+            )
+
+        return plan_prompt
+
+    def _create_join_prompt(self, prompt: str, observations: List[Tuple[Dict[str, Any], str]]) -> str:
+        """Crea el prompt para generar la respuesta final."""
+        if not observations:
+            return prompt
+
+        return f"{prompt}\n{self.RESULTS_HEADER}\n{self._format_observations(observations)}\n"
+
+    @staticmethod
+    def _format_observations(observations: List[Tuple[Dict[str, Any], str]]) -> str:
+        """Formatea las observaciones para incluirlas en un prompt."""
+        return "\n".join(
+            f"[{node['id']}] {node['tool']}({LLMCompilerAgent._format_args(node.get('args', []))}): {output}"
+            for node, output in observations
+        )
+
+    @staticmethod
+    def _format_args(args: Any) -> str:
+        """Formatea los argumentos de un nodo (lista u objeto JSON)."""
+        if isinstance(args, dict):
+            return ", ".join(f"{name}={arg}" for name, arg in args.items())
+        if isinstance(args, list):
+            return ", ".join(map(str, args))
+        return str(args)
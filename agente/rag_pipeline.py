@@ -11,11 +11,18 @@ Fecha: 2024
 """
 
 import os
-import json
+import re
+import asyncio
 import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+import numpy as np
+import orjson
+
 # Importaciones de LangChain
 # Importaciones modernas de LangChain y módulos asociados
 
@@ -24,6 +31,8 @@ from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 
 # Vectorstores y loaders
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import TextLoader, PyPDFLoader
 
@@ -36,24 +45,211 @@ from langchain_community.llms import OpenAI
 # Tipos de documentos
 from langchain.schema import Document
 
+from .cache import SemanticCache, cosine_similarities, normalize_query
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tokenización usada por el vectorstore simulado
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Número de vectores a partir del cual el índice FAISS se cuantiza a FP16
+QUANTIZE_MIN_VECTORS = 1024
+
+# Número de vectores a partir del cual se usa un índice HNSW aproximado
+HNSW_MIN_VECTORS = 10000
+
+# Hilos del pool propio con el que se construye el vectorstore
+EMBED_WORKERS = 4
+
+# Base de conocimiento simulada (compartida por todas las instancias)
+_SIMULATED_KB = {
+    "politicas_devolucion": """
+    POLÍTICAS DE DEVOLUCIÓN ECOAGENT
+    =================================
+    
+    Períodos de Devolución:
+    - Electrónicos: 30 días desde la compra
+    - Computadoras: 15 días desde la compra
+    - Audio: 14 días desde la compra
+    - Tablets: 7 días desde la compra
+    
+    Condiciones Requeridas:
+    1. Producto en estado original
+    2. Empaque y accesorios incluidos
+    3. Recibo de compra válido
+    4. No haber sido usado excesivamente
+    
+    Proceso de Devolución:
+    1. Verificar elegibilidad del producto
+    2. Generar etiqueta de devolución
+    3. Enviar producto a centro de retornos
+    4. Procesar reembolso en 5-7 días hábiles
+    
+    Excepciones:
+    - Productos personalizados no son elegibles
+    - Software con licencia activada no es elegible
+    - Productos de higiene personal no son elegibles
+    """,
+    
+    "procedimientos_calidad": """
+    PROCEDIMIENTOS DE CONTROL DE CALIDAD
+    ====================================
+    
+    Inspección de Productos Devueltos:
+    1. Verificar estado físico del producto
+    2. Comprobar que todos los accesorios estén incluidos
+    3. Verificar que el producto funcione correctamente
+    4. Documentar cualquier daño o defecto
+    
+    Criterios de Aceptación:
+    - Producto sin daños visibles
+    - Funcionalidad completa
+    - Accesorios originales incluidos
+    - Empaque en buen estado
+    
+    Proceso de Reembolso:
+    - Reembolso completo si cumple criterios
+    - Reembolso parcial si hay daños menores
+    - Sin reembolso si hay daños mayores
+    """,
+    
+    "informacion_productos": """
+    INFORMACIÓN DE PRODUCTOS ECOAGENT
+    ==================================
+    
+    Categorías de Productos:
+    
+    Electrónicos:
+    - Smartphones EcoTech Pro (PROD001)
+    - Tablets EcoPad (PROD004)
+    - Dispositivos IoT EcoSmart
+    
+    Computadoras:
+    - Laptops EcoFriendly (PROD002)
+    - Desktops EcoWorkstation
+    - Accesorios EcoAccessories
+    
+    Audio:
+    - Auriculares Wireless (PROD003)
+    - Altavoces EcoSound
+    - Sistemas de audio EcoAudio
+    
+    Especificaciones Técnicas:
+    - Todos los productos son eco-friendly
+    - Certificación de sostenibilidad
+    - Garantía extendida disponible
+    - Soporte técnico 24/7
+    """,
+    
+    "soporte_cliente": """
+    SOPORTE AL CLIENTE ECOAGENT
+    ============================
+    
+    Canales de Contacto:
+    - Email: soporte@ecotech.com
+    - Teléfono: +1-800-ECO-TECH
+    - Chat en vivo: Disponible 24/7
+    - Centro de ayuda: help.ecotech.com
+    
+    Servicios Disponibles:
+    - Consultas sobre devoluciones
+    - Soporte técnico
+    - Información de productos
+    - Seguimiento de pedidos
+    
+    Tiempos de Respuesta:
+    - Email: 2-4 horas
+    - Teléfono: Inmediato
+    - Chat: Inmediato
+    - Tickets: 1-2 horas
+    """
+}
+
+
+def _load_json_file(file_path: str) -> List[Document]:
+    """Carga un archivo JSON como un único documento."""
+    with open(file_path, 'rb') as f:
+        data = orjson.loads(f.read())
+    return [Document(page_content=str(data), metadata={"source": file_path, "type": "json"})]
+
+
+# Loader por extensión de archivo del directorio data
+_FILE_LOADERS = {
+    ".txt": lambda file_path: TextLoader(file_path).load(),
+    ".pdf": lambda file_path: PyPDFLoader(file_path).load(),
+    ".json": _load_json_file,
+}
+
+
+def _load_data_file(file_path: str) -> List[Document]:
+    """Carga un archivo según su extensión; devuelve [] si falla."""
+    try:
+        return _FILE_LOADERS[os.path.splitext(file_path)[1].lower()](file_path)
+    except Exception as e:
+        logger.warning(f"No se pudo cargar {os.path.basename(file_path)}: {e}")
+        return []
+
+
+_MISSING = object()
+
+
+class locked_cached_property:
+    """
+    Variante de functools.cached_property segura entre hilos.
+    
+    Cada componente tiene su propio bloqueo por instancia, de modo que varias
+    consultas concurrentes no lo construyen dos veces y un componente puede
+    construir otro distinto (p. ej. el vectorstore a los embeddings) sin
+    bloquearse.
+    """
+    
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+    
+    def __set_name__(self, owner, name):
+        self.attrname = name
+        self.lockname = f"_{name}_lock"
+    
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        
+        cache = instance.__dict__
+        value = cache.get(self.attrname, _MISSING)
+        if value is not _MISSING:
+            return value
+        
+        lock = cache.setdefault(self.lockname, threading.Lock())
+        with lock:
+            # Otro hilo pudo construirlo mientras se esperaba el bloqueo
+            value = cache.get(self.attrname, _MISSING)
+            if value is _MISSING:
+                value = self.func(instance)
+                cache[self.attrname] = value
+        return value
+
 
 class EcoRAGPipeline:
     """Pipeline RAG para el EcoAgent con capacidades de recuperación de información."""
     
-    def __init__(self, openai_api_key: str = None, model_name: str = "gpt-4o-mini"):
+    def __init__(self, openai_api_key: str = None, model_name: str = "gpt-4o-mini",
+                 cache_threshold: Optional[float] = 0.97, temperature: float = 0.1):
         """
         Inicializar el pipeline RAG.
         
         Args:
             openai_api_key (str): Clave API de OpenAI
             model_name (str): Nombre del modelo a utilizar
+            cache_threshold (float, optional): Similitud coseno mínima para reutilizar
+                la respuesta de una pregunta anterior (None desactiva el cache)
+            temperature (float): Temperatura del LLM de la cadena QA
         """
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         self.model_name = model_name
+        self.temperature = temperature
         
         if not self.openai_api_key:
             logger.warning("No se encontró OPENAI_API_KEY. Usando modelo simulado.")
@@ -61,133 +257,145 @@ class EcoRAGPipeline:
         else:
             self.use_simulated_model = False
         
-        # Inicializar componentes
-        self.embeddings = None
-        self.vectorstore = None
-        self.retriever = None
-        self.qa_chain = None
+        # Los componentes (embeddings, vectorstore, retriever, qa_chain) se
+        # construyen bajo demanda en la primera consulta
         
-        # Datos simulados para cuando no hay API key
-        self.simulated_knowledge_base = self._create_simulated_knowledge_base()
+        # Candidatos explorados por búsqueda en índices HNSW
+        self._ef_search = 40
+        
+        # Cache semántico de respuestas, indexado por el embedding de la pregunta
+        self.query_cache = SemanticCache(threshold=cache_threshold, maxsize=1024) if cache_threshold else None
         
         logger.info("Pipeline RAG inicializado correctamente")
     
+    @property
+    def ef_search(self) -> int:
+        """Candidatos explorados por búsqueda HNSW (más alto = más recall, más latencia)."""
+        return self._ef_search
+    
+    @ef_search.setter
+    def ef_search(self, value: int):
+        self._ef_search = value
+        index = getattr(self.__dict__.get("vectorstore"), "index", None)
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = value
+    
+    @locked_cached_property
+    def simulated_knowledge_base(self) -> Dict[str, str]:
+        """Datos simulados usados como documentos base del vectorstore."""
+        return self._create_simulated_knowledge_base()
+    
+    @locked_cached_property
+    def embeddings(self):
+        """Modelo de embeddings (None si no hay ninguno disponible)."""
+        return self._create_embeddings()
+    
+    @locked_cached_property
+    def vectorstore(self):
+        """Vectorstore con los documentos por defecto."""
+        return self._create_vectorstore()
+    
+    @locked_cached_property
+    def retriever(self):
+        """Retriever sobre el vectorstore."""
+        return self._create_retriever()
+    
+    @locked_cached_property
+    def qa_chain(self):
+        """Cadena de QA sobre el retriever."""
+        return self._create_qa_chain()
+    
+    def _reset_components(self, *names: str):
+        """Descarta componentes ya construidos para que se reconstruyan al usarse."""
+        for name in names:
+            self.__dict__.pop(name, None)
+    
     def _create_simulated_knowledge_base(self) -> Dict[str, str]:
-        """Crea una base de conocimiento simulada para pruebas."""
-        return {
-            "politicas_devolucion": """
-            POLÍTICAS DE DEVOLUCIÓN ECOAGENT
-            =================================
-            
-            Períodos de Devolución:
-            - Electrónicos: 30 días desde la compra
-            - Computadoras: 15 días desde la compra
-            - Audio: 14 días desde la compra
-            - Tablets: 7 días desde la compra
-            
-            Condiciones Requeridas:
-            1. Producto en estado original
-            2. Empaque y accesorios incluidos
-            3. Recibo de compra válido
-            4. No haber sido usado excesivamente
-            
-            Proceso de Devolución:
-            1. Verificar elegibilidad del producto
-            2. Generar etiqueta de devolución
-            3. Enviar producto a centro de retornos
-            4. Procesar reembolso en 5-7 días hábiles
-            
-            Excepciones:
-            - Productos personalizados no son elegibles
-            - Software con licencia activada no es elegible
-            - Productos de higiene personal no son elegibles
-            """,
-            
-            "procedimientos_calidad": """
-            PROCEDIMIENTOS DE CONTROL DE CALIDAD
-            ====================================
-            
-            Inspección de Productos Devueltos:
-            1. Verificar estado físico del producto
-            2. Comprobar que todos los accesorios estén incluidos
-            3. Verificar que el producto funcione correctamente
-            4. Documentar cualquier daño o defecto
-            
-            Criterios de Aceptación:
-            - Producto sin daños visibles
-            - Funcionalidad completa
-            - Accesorios originales incluidos
-            - Empaque en buen estado
-            
-            Proceso de Reembolso:
-            - Reembolso completo si cumple criterios
-            - Reembolso parcial si hay daños menores
-            - Sin reembolso si hay daños mayores
-            """,
-            
-            "informacion_productos": """
-            INFORMACIÓN DE PRODUCTOS ECOAGENT
-            ==================================
-            
-            Categorías de Productos:
-            
-            Electrónicos:
-            - Smartphones EcoTech Pro (PROD001)
-            - Tablets EcoPad (PROD004)
-            - Dispositivos IoT EcoSmart
-            
-            Computadoras:
-            - Laptops EcoFriendly (PROD002)
-            - Desktops EcoWorkstation
-            - Accesorios EcoAccessories
-            
-            Audio:
-            - Auriculares Wireless (PROD003)
-            - Altavoces EcoSound
-            - Sistemas de audio EcoAudio
-            
-            Especificaciones Técnicas:
-            - Todos los productos son eco-friendly
-            - Certificación de sostenibilidad
-            - Garantía extendida disponible
-            - Soporte técnico 24/7
-            """,
-            
-            "soporte_cliente": """
-            SOPORTE AL CLIENTE ECOAGENT
-            ============================
-            
-            Canales de Contacto:
-            - Email: soporte@ecotech.com
-            - Teléfono: +1-800-ECO-TECH
-            - Chat en vivo: Disponible 24/7
-            - Centro de ayuda: help.ecotech.com
-            
-            Servicios Disponibles:
-            - Consultas sobre devoluciones
-            - Soporte técnico
-            - Información de productos
-            - Seguimiento de pedidos
-            
-            Tiempos de Respuesta:
-            - Email: 2-4 horas
-            - Teléfono: Inmediato
-            - Chat: Inmediato
-            - Tickets: 1-2 horas
-            """
-        }
+        """Devuelve la base de conocimiento simulada para pruebas."""
+        return _SIMULATED_KB
     
     def initialize_embeddings(self):
-        """Inicializa el modelo de embeddings."""
+        """Inicializa el modelo de embeddings (y descarta los componentes que dependen de él)."""
+        self.embeddings = self._create_embeddings()
+        self._reset_components("vectorstore", "retriever", "qa_chain")
+    
+    async def aget_embeddings(self):
+        """
+        Obtiene el modelo de embeddings sin bloquear el event loop.
+        
+        Returns:
+            Modelo de embeddings, o None si no hay ninguno disponible
+        """
+        embeddings = self.__dict__.get("embeddings", _MISSING)
+        if embeddings is not _MISSING:
+            return embeddings
+        return await asyncio.to_thread(lambda: self.embeddings)
+    
+    def _create_embeddings(self):
+        """
+        Crea el modelo de embeddings.
+        
+        Con ECOAGENT_LOCAL_EMBED=1 y una GPU CUDA disponible se usa FastEmbed
+        en GPU. Sin API key se usan embeddings locales de FastEmbed (ONNX
+        Runtime); solo si no están disponibles se recurre a la búsqueda por
+        palabras clave.
+        """
         try:
+            if os.getenv("ECOAGENT_LOCAL_EMBED") == "1":
+                embeddings = self._create_gpu_embeddings()
+                if embeddings is not None:
+                    return embeddings
+            
             if not self.use_simulated_model:
-                self.embeddings = OpenAIEmbeddings(openai_api_key=self.openai_api_key)
+                embeddings = OpenAIEmbeddings(openai_api_key=self.openai_api_key)
                 logger.info("Embeddings de OpenAI inicializados")
-            else:
-                logger.info("Usando embeddings simulados")
+                return embeddings
+            
+            try:
+                from langchain_community.embeddings import FastEmbedEmbeddings
+                
+                embeddings = FastEmbedEmbeddings(
+                    model_name="BAAI/bge-small-en-v1.5",
+                    threads=os.cpu_count()
+                )
+                logger.info("Embeddings locales de FastEmbed inicializados")
+                return embeddings
+            except Exception as e:
+                logger.warning(f"FastEmbed no disponible ({e}). Usando búsqueda por palabras clave")
         except Exception as e:
             logger.error(f"Error al inicializar embeddings: {e}")
             self.use_simulated_model = True
+        return None
+    
+    def _create_gpu_embeddings(self):
+        """Crea embeddings FastEmbed sobre CUDAExecutionProvider (None si no hay GPU)."""
+        try:
+            import onnxruntime
+            
+            if "CUDAExecutionProvider" not in onnxruntime.get_available_providers():
+                logger.info("ECOAGENT_LOCAL_EMBED activo, pero no hay GPU CUDA disponible")
+                return None
+            
+            from fastembed import TextEmbedding
+            from langchain_core.embeddings import Embeddings
+        except Exception as e:
+            logger.warning(f"Embeddings locales en GPU no disponibles: {e}")
+            return None
+        
+        class GPUFastEmbedEmbeddings(Embeddings):
+            def __init__(self, model, batch_size: int = 256):
+                self.model = model
+                self.batch_size = batch_size
+            
+            def embed_documents(self, texts: List[str]) -> List[List[float]]:
+                return [vector.tolist() for vector in self.model.embed(texts, batch_size=self.batch_size)]
+            
+            def embed_query(self, text: str) -> List[float]:
+                return self.embed_documents([text])[0]
+        
+        model = TextEmbedding(model_name="BAAI/bge-small-en-v1.5", providers=["CUDAExecutionProvider"])
+        logger.info("Embeddings locales de FastEmbed en GPU inicializados")
+        return GPUFastEmbedEmbeddings(model)
     
     def create_vectorstore(self, documents: List[Document] = None):
         """
@@ -196,22 +404,139 @@ class EcoRAGPipeline:
         Args:
             documents (List[Document]): Lista de documentos para indexar
         """
+        self.vectorstore = self._create_vectorstore(documents)
+        self._reset_components("retriever", "qa_chain")
+    
+    def _create_vectorstore(self, documents: List[Document] = None):
+        """
+        Construye el vectorstore (por defecto, con los documentos del directorio data).
+        
+        Se construye de forma síncrona con un pool de hilos propio: puede
+        llamarse desde un hilo del executor por defecto del event loop sin
+        depender de que queden hilos libres en él.
+        
+        Raises:
+            Exception: Si no se pudo construir; el siguiente acceso lo reintenta
+        """
         try:
-            if documents is None:
-                documents = self._load_default_documents()
-            
-            if not self.use_simulated_model and self.embeddings:
-                # Usar embeddings reales
-                self.vectorstore = FAISS.from_documents(documents, self.embeddings)
-                logger.info(f"Vectorstore creado con {len(documents)} documentos")
-            else:
-                # Crear vectorstore simulado
-                self.vectorstore = self._create_simulated_vectorstore(documents)
-                logger.info("Vectorstore simulado creado")
+            with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as executor:
+                if documents is None:
+                    # Cargar documentos (disco) mientras se inicializan los embeddings (red/modelo)
+                    embeddings_ready = executor.submit(lambda: self.embeddings)
+                    documents = self._load_default_documents()
+                    embeddings_ready.result()
+                
+                # Las respuestas cacheadas dependen de los documentos indexados
+                if self.query_cache is not None:
+                    self.query_cache.clear()
+                
+                if self.embeddings:
+                    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=120)
+                    chunks = splitter.split_documents(documents)
+                    texts = [chunk.page_content for chunk in chunks]
+                    vectors = self._embed_all(texts, executor, batch=256)
+                    
+                    vectorstore = self._build_faiss_vectorstore(chunks, vectors)
+                    logger.info(f"Vectorstore creado con {len(documents)} documentos ({len(chunks)} fragmentos)")
+                else:
+                    # Crear vectorstore simulado
+                    vectorstore = self._create_simulated_vectorstore(documents)
+                    logger.info("Vectorstore simulado creado")
+            return vectorstore
                 
         except Exception as e:
             logger.error(f"Error al crear vectorstore: {e}")
-            self.vectorstore = self._create_simulated_vectorstore(documents or [])
+            raise
+    
+    def _build_faiss_vectorstore(self, chunks: List[Document], vectors: List[List[float]]):
+        """
+        Construye el vectorstore FAISS de similitud coseno.
+        
+        Los vectores se normalizan y se indexan por producto interno. A partir
+        de QUANTIZE_MIN_VECTORS se guardan en FP16 (IndexScalarQuantizer), lo
+        que reduce a la mitad la memoria recorrida en cada búsqueda; a partir
+        de HNSW_MIN_VECTORS se usa un grafo HNSW con búsqueda sub-lineal.
+        
+        Args:
+            chunks (List[Document]): Fragmentos indexados
+            vectors (List[List[float]]): Embeddings de los fragmentos
+            
+        Returns:
+            FAISS: Vectorstore listo para búsquedas (denso en memoria si falta FAISS)
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        
+        try:
+            import faiss
+        except ImportError:
+            logger.warning("FAISS no disponible. Usando búsqueda densa en memoria")
+            return self._create_dense_vectorstore(chunks, matrix)
+        
+        dim = matrix.shape[1]
+        
+        if len(matrix) >= HNSW_MIN_VECTORS:
+            index = faiss.IndexHNSWFlat(dim, 16, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 64
+            index.hnsw.efSearch = self._ef_search
+            logger.info(f"Índice FAISS HNSW creado ({len(matrix)} vectores)")
+        elif len(matrix) >= QUANTIZE_MIN_VECTORS:
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+            index.train(matrix)
+            logger.info(f"Índice FAISS cuantizado a FP16 ({len(matrix)} vectores)")
+        else:
+            index = faiss.IndexFlatIP(dim)
+        index.add(matrix)
+        
+        ids = [str(i) for i in range(len(chunks))]
+        return FAISS(
+            self.embeddings,
+            index,
+            InMemoryDocstore(dict(zip(ids, chunks))),
+            dict(enumerate(ids)),
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+    
+    def _create_dense_vectorstore(self, chunks: List[Document], matrix: np.ndarray):
+        """Crea un vectorstore denso en memoria para cuando FAISS no está instalado."""
+        embeddings = self.embeddings
+        
+        class DenseVectorStore:
+            def __init__(self, docs, vectors):
+                self.documents = docs
+                self.vectors = vectors
+            
+            def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+                """Búsqueda exacta por similitud coseno."""
+                if not self.documents or k <= 0:
+                    return []
+                
+                query_vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+                query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+                scores = cosine_similarities(self.vectors, query_vector)
+                k = min(k, len(scores))
+                
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top], kind="stable")]
+                return [self.documents[i] for i in top]
+        
+        return DenseVectorStore(chunks, matrix)
+    
+    def _embed_all(self, texts: List[str], executor: ThreadPoolExecutor, batch: int = 256) -> List[List[float]]:
+        """
+        Calcula los embeddings de todos los textos en lotes concurrentes.
+        
+        Args:
+            texts (List[str]): Textos a vectorizar
+            executor (ThreadPoolExecutor): Pool en el que se envían los lotes
+            batch (int): Número de textos por petición
+            
+        Returns:
+            List[List[float]]: Embeddings en el mismo orden que los textos
+        """
+        batches = [texts[i:i + batch] for i in range(0, len(texts), batch)]
+        results = executor.map(self.embeddings.embed_documents, batches)
+        return [vector for result in results for vector in result]
     
     def _load_default_documents(self) -> List[Document]:
         """Carga documentos por defecto del directorio data."""
@@ -225,30 +550,16 @@ class EcoRAGPipeline:
             )
             documents.append(doc)
         
-        # Intentar cargar archivos del directorio data
+        # Intentar cargar archivos del directorio data (en paralelo: E/S y parseo de PDF)
         data_dir = "data"
         if os.path.exists(data_dir):
-            for filename in os.listdir(data_dir):
-                file_path = os.path.join(data_dir, filename)
-                try:
-                    if filename.endswith('.txt'):
-                        loader = TextLoader(file_path)
-                        docs = loader.load()
-                        documents.extend(docs)
-                    elif filename.endswith('.pdf'):
-                        loader = PyPDFLoader(file_path)
-                        docs = loader.load()
+            paths = [os.path.join(data_dir, filename) for filename in os.listdir(data_dir)
+                     if os.path.splitext(filename)[1].lower() in _FILE_LOADERS]
+            
+            if paths:
+                with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+                    for docs in executor.map(_load_data_file, paths):
                         documents.extend(docs)
-                    elif filename.endswith('.json'):
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            doc = Document(
-                                page_content=str(data),
-                                metadata={"source": file_path, "type": "json"}
-                            )
-                            documents.append(doc)
-                except Exception as e:
-                    logger.warning(f"No se pudo cargar {filename}: {e}")
         
         return documents
     
@@ -257,29 +568,31 @@ class EcoRAGPipeline:
         class SimulatedVectorStore:
             def __init__(self, docs):
                 self.documents = docs
+                
+                # Índice invertido: token -> conteo del token en cada documento
+                self.index: Dict[str, np.ndarray] = {}
+                for i, doc in enumerate(docs):
+                    for token, count in Counter(TOKEN_PATTERN.findall(doc.page_content.lower())).items():
+                        counts = self.index.get(token)
+                        if counts is None:
+                            counts = self.index[token] = np.zeros(len(docs), dtype=np.uint32)
+                        counts[i] = count
             
             def similarity_search(self, query: str, k: int = 4) -> List[Document]:
                 """Búsqueda de similitud simulada."""
-                # Simular búsqueda basada en palabras clave
-                query_lower = query.lower()
-                scored_docs = []
+                # Score = suma de apariciones de cada token de la consulta
+                rows = [self.index[token] for token in TOKEN_PATTERN.findall(query.lower())
+                        if token in self.index]
+                if not rows or k <= 0:
+                    return []
                 
-                for doc in self.documents:
-                    content_lower = doc.page_content.lower()
-                    score = 0
-                    
-                    # Calcular score basado en palabras clave
-                    keywords = query_lower.split()
-                    for keyword in keywords:
-                        if keyword in content_lower:
-                            score += content_lower.count(keyword)
-                    
-                    if score > 0:
-                        scored_docs.append((score, doc))
+                scores = np.sum(rows, axis=0, dtype=np.int64)
+                k = min(k, len(scores))
                 
-                # Ordenar por score y retornar top k
-                scored_docs.sort(key=lambda x: x[0], reverse=True)
-                return [doc for _, doc in scored_docs[:k]]
+                # Top k sin ordenar todo; desempate por orden original
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.lexsort((top, -scores[top]))]
+                return [self.documents[i] for i in top if scores[i] > 0]
         
         return SimulatedVectorStore(documents)
     
@@ -290,75 +603,102 @@ class EcoRAGPipeline:
         Args:
             k (int): Número de documentos a recuperar
         """
+        self.retriever = self._create_retriever(k)
+        self._reset_components("qa_chain")
+    
+    def _create_retriever(self, k: int = 4):
+        """Construye el retriever sobre el vectorstore actual."""
         if self.vectorstore:
             if hasattr(self.vectorstore, 'as_retriever'):
-                self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": k})
+                retriever = self.vectorstore.as_retriever(search_kwargs={"k": k})
             else:
                 # Retriever simulado
-                self.retriever = self.vectorstore
+                retriever = self.vectorstore
             logger.info(f"Retriever creado con k={k}")
-        else:
-            logger.error("No se puede crear retriever sin vectorstore")
+            return retriever
+        
+        logger.error("No se puede crear retriever sin vectorstore")
+        return None
     
     def create_qa_chain(self):
         """Crea la cadena de QA para responder preguntas."""
+        self.qa_chain = self._create_qa_chain()
+    
+    def _create_qa_chain(self):
+        """Construye la cadena de QA (simulada si no se puede crear la real)."""
+        # Un fallo al construir el retriever se propaga: no se oculta tras la cadena simulada
+        retriever = self.retriever
         try:
             if not self.use_simulated_model and self.openai_api_key:
                 llm = ChatOpenAI(
                     model_name=self.model_name,
                     openai_api_key=self.openai_api_key,
-                    temperature=0.1
+                    temperature=self.temperature
                 )
             else:
                 # LLM simulado
                 llm = self._create_simulated_llm()
             
-            if self.retriever:
-                self.qa_chain = RetrievalQA.from_chain_type(
+            if retriever:
+                qa_chain = RetrievalQA.from_chain_type(
                     llm=llm,
                     chain_type="stuff",
-                    retriever=self.retriever,
+                    retriever=retriever,
                     return_source_documents=True
                 )
                 logger.info("Cadena QA creada exitosamente")
-            else:
-                logger.error("No se puede crear QA chain sin retriever")
+                return qa_chain
+            
+            logger.error("No se puede crear QA chain sin retriever")
+            return None
                 
         except Exception as e:
             logger.error(f"Error al crear QA chain: {e}")
-            self.qa_chain = self._create_simulated_qa_chain()
+            return self._create_simulated_qa_chain(self._create_simulated_llm(), retriever)
     
     def _create_simulated_llm(self):
         """Crea un LLM simulado para pruebas."""
         class SimulatedLLM:
+            # Una sola pasada de regex sobre el prompt en lugar de un `in` por regla
+            _PATTERN = re.compile(
+                r"(?P<devolucion>devoluci[oó]n|devolver)|(?P<politica>pol[ií]tica)|(?P<soporte>soporte|ayuda)",
+                re.IGNORECASE
+            )
+            _PRIORITY = ("devolucion", "politica", "soporte")
+            _RESPONSES = {
+                "devolucion": "Para procesar una devolución, necesito verificar la elegibilidad del producto y generar una etiqueta de devolución.",
+                "politica": "Las políticas de devolución varían según la categoría del producto. Los electrónicos tienen 30 días, computadoras 15 días, audio 14 días y tablets 7 días.",
+                "soporte": "Puedo ayudarte con consultas sobre devoluciones, información de productos y políticas de la empresa."
+            }
+            _DEFAULT = "Soy EcoAgent, tu asistente para devoluciones. ¿En qué puedo ayudarte?"
+            
             def __init__(self):
                 self.name = "SimulatedLLM"
             
             def __call__(self, prompt: str) -> str:
                 """Simula respuesta del LLM basada en el prompt."""
-                prompt_lower = prompt.lower()
+                matched = {m.lastgroup for m in self._PATTERN.finditer(prompt)}
                 
-                if "devolución" in prompt_lower or "devolver" in prompt_lower:
-                    return "Para procesar una devolución, necesito verificar la elegibilidad del producto y generar una etiqueta de devolución."
-                elif "política" in prompt_lower:
-                    return "Las políticas de devolución varían según la categoría del producto. Los electrónicos tienen 30 días, computadoras 15 días, audio 14 días y tablets 7 días."
-                elif "soporte" in prompt_lower or "ayuda" in prompt_lower:
-                    return "Puedo ayudarte con consultas sobre devoluciones, información de productos y políticas de la empresa."
-                else:
-                    return "Soy EcoAgent, tu asistente para devoluciones. ¿En qué puedo ayudarte?"
+                for intent in self._PRIORITY:
+                    if intent in matched:
+                        return self._RESPONSES[intent]
+                return self._DEFAULT
         
         return SimulatedLLM()
     
-    def _create_simulated_qa_chain(self):
+    def _create_simulated_qa_chain(self, llm, retriever=None):
         """Crea una cadena QA simulada."""
         class SimulatedQAChain:
-            def __init__(self):
-                self.llm = self._create_simulated_llm()
+            def __init__(self, llm, retriever):
+                self.llm = llm
+                self.retriever = retriever
             
             def run(self, query: str) -> Dict[str, Any]:
                 """Ejecuta la consulta QA simulada."""
                 # Buscar documentos relevantes
-                if hasattr(self, 'retriever') and self.retriever:
+                if hasattr(self.retriever, 'get_relevant_documents'):
+                    docs = self.retriever.get_relevant_documents(query)[:2]
+                elif self.retriever:
                     docs = self.retriever.similarity_search(query, k=2)
                 else:
                     docs = []
@@ -371,7 +711,7 @@ class EcoRAGPipeline:
                     "source_documents": docs
                 }
         
-        return SimulatedQAChain()
+        return SimulatedQAChain(llm, retriever)
     
     def query(self, question: str) -> Dict[str, Any]:
         """
@@ -381,17 +721,29 @@ class EcoRAGPipeline:
             question (str): Pregunta a responder
             
         Returns:
-            Dict[str, Any]: Respuesta y documentos fuente
+            Dict[str, Any]: Respuesta, documentos fuente y estado de la consulta
+                ("success", "unavailable" o "error")
         """
         try:
             logger.info(f"Ejecutando consulta: {question}")
             
             if self.qa_chain:
-                if hasattr(self.qa_chain, 'run'):
-                    result = self.qa_chain.run(question)
+                question_vector = self._embed_for_cache(question)
+                if question_vector is not None:
+                    cached = self.query_cache.lookup(question_vector)
+                    if cached is not None:
+                        logger.info("Respuesta obtenida del cache semántico")
+                        return cached
+                
+                if hasattr(self.qa_chain, 'invoke'):
+                    result = self.qa_chain.invoke({"query": question})
                 else:
                     # Para cadenas simuladas
                     result = self.qa_chain.run(question)
+                result = {**result, "status": "success"}
+                
+                if question_vector is not None:
+                    self.query_cache.add(question_vector, result)
                 
                 logger.info("Consulta ejecutada exitosamente")
                 return result
@@ -399,32 +751,41 @@ class EcoRAGPipeline:
                 # Respuesta de fallback
                 return {
                     "result": "Lo siento, el sistema RAG no está disponible en este momento.",
-                    "source_documents": []
+                    "source_documents": [],
+                    "status": "unavailable"
                 }
                 
         except Exception as e:
             logger.error(f"Error al ejecutar consulta: {e}")
             return {
                 "result": f"Error al procesar la consulta: {str(e)}",
-                "source_documents": []
+                "source_documents": [],
+                "status": "error"
             }
     
+    def _embed_for_cache(self, question: str) -> Optional[List[float]]:
+        """Calcula el embedding de la pregunta para el cache semántico, si está activo."""
+        if self.query_cache is None or self.embeddings is None:
+            return None
+        
+        try:
+            return self.embeddings.embed_query(normalize_query(question))
+        except Exception as e:
+            logger.warning(f"No se pudo calcular embedding para cache: {e}")
+            return None
+    
     def initialize_pipeline(self):
-        """Inicializa todo el pipeline RAG."""
+        """
+        Construye por adelantado todos los componentes del pipeline RAG.
+        
+        Es opcional: sin llamarlo, cada componente se construye en la
+        primera consulta que lo necesita.
+        """
         try:
             logger.info("Inicializando pipeline RAG completo...")
             
-            # 1. Inicializar embeddings
-            self.initialize_embeddings()
-            
-            # 2. Crear vectorstore
-            self.create_vectorstore()
-            
-            # 3. Crear retriever
-            self.create_retriever()
-            
-            # 4. Crear QA chain
-            self.create_qa_chain()
+            # La cadena QA construye en cascada retriever, vectorstore y embeddings
+            _ = self.qa_chain
             
             logger.info("Pipeline RAG inicializado completamente")
             
@@ -434,19 +795,18 @@ class EcoRAGPipeline:
 
 
 # Función de conveniencia para crear el pipeline
-def create_rag_pipeline(openai_api_key: str = None) -> EcoRAGPipeline:
+def create_rag_pipeline(openai_api_key: str = None, temperature: float = 0.1) -> EcoRAGPipeline:
     """
-    Crea e inicializa un pipeline RAG completo.
+    Crea un pipeline RAG cuyos componentes se construyen en la primera consulta.
     
     Args:
         openai_api_key (str): Clave API de OpenAI
+        temperature (float): Temperatura del LLM de la cadena QA
         
     Returns:
-        EcoRAGPipeline: Pipeline inicializado
+        EcoRAGPipeline: Pipeline listo para consultas
     """
-    pipeline = EcoRAGPipeline(openai_api_key)
-    pipeline.initialize_pipeline()
-    return pipeline
+    return EcoRAGPipeline(openai_api_key, temperature=temperature)
 
 
 if __name__ == "__main__":
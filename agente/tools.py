@@ -9,61 +9,141 @@ Autor: EcoAgent Team
 Fecha: 2024
 """
 
-import json
+import os
+import sys
+import base64
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
-import random
-import string
+from datetime import date, datetime
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional
+
+import numpy as np
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Base de datos simulada de productos
+_PRODUCTOS = {
+    "PROD001": {
+        "nombre": "Smartphone EcoTech Pro",
+        "categoria": "Electrónicos",
+        "precio": 299.99,
+        "garantia_dias": 30,
+        "elegible_devolucion": True
+    },
+    "PROD002": {
+        "nombre": "Laptop EcoFriendly",
+        "categoria": "Computadoras",
+        "precio": 899.99,
+        "garantia_dias": 15,
+        "elegible_devolucion": True
+    },
+    "PROD003": {
+        "nombre": "Auriculares Wireless",
+        "categoria": "Audio",
+        "precio": 79.99,
+        "garantia_dias": 14,
+        "elegible_devolucion": True
+    },
+    "PROD004": {
+        "nombre": "Tablet EcoPad",
+        "categoria": "Tablets",
+        "precio": 199.99,
+        "garantia_dias": 7,
+        "elegible_devolucion": False  # Producto no elegible
+    }
+}
+
+# Base de datos simulada de clientes
+_CLIENTES = {
+    "CLI001": {"nombre": "Juan Pérez", "email": "juan@email.com", "tipo": "premium"},
+    "CLI002": {"nombre": "María García", "email": "maria@email.com", "tipo": "estándar"},
+    "CLI003": {"nombre": "Carlos López", "email": "carlos@email.com", "tipo": "premium"},
+}
+
+# Políticas de devolución (texto estático, precalculado una sola vez)
+_POLITICAS_GENERALES = """
+📋 POLÍTICAS GENERALES DE DEVOLUCIÓN
+====================================
+
+⏰ Períodos de Devolución:
+• Electrónicos: 30 días
+• Computadoras: 15 días  
+• Audio: 14 días
+• Tablets: 7 días
+
+✅ Condiciones para Devolución:
+• Producto en estado original
+• Empaque y accesorios incluidos
+• Recibo de compra válido
+• No haber sido usado excesivamente
+
+❌ Productos No Elegibles:
+• Productos personalizados
+• Software con licencia activada
+• Productos de higiene personal
+• Alimentos perecederos
+
+💰 Proceso de Reembolso:
+• Reembolso completo si cumple condiciones
+• Procesamiento en 5-7 días hábiles
+• Mismo método de pago original
+"""
+
+_CATEGORIA_POLITICAS = {
+    "Electrónicos": "📱 Electrónicos: Garantía extendida de 30 días, incluye smartphones, tablets y dispositivos móviles.",
+    "Computadoras": "💻 Computadoras: Garantía de 15 días, incluye laptops, desktops y componentes.",
+    "Audio": "🎧 Audio: Garantía de 14 días, incluye auriculares, altavoces y equipos de sonido.",
+    "Tablets": "📱 Tablets: Garantía de 7 días, dispositivos táctiles y tablets."
+}
+
+_POLITICAS_COMBINADAS = {
+    categoria: f"{_POLITICAS_GENERALES}\n\n{texto}" for categoria, texto in _CATEGORIA_POLITICAS.items()
+}
+
+
+# Mensaje de condiciones adicionales, indexado por (cerca del límite) | (alto valor) << 1
+_CONDICION_CERCA_LIMITE = "⚠️ Nota: Está cerca del límite del período de devolución."
+_CONDICION_ALTO_VALOR = "💎 Producto de alto valor: Se requiere inspección adicional."
+_MENSAJES_CONDICIONES = (
+    "✅ Todas las condiciones cumplidas.",
+    _CONDICION_CERCA_LIMITE,
+    _CONDICION_ALTO_VALOR,
+    f"{_CONDICION_CERCA_LIMITE}\n{_CONDICION_ALTO_VALOR}",
+)
+
+
+def _parse_fecha(fecha: str) -> date:
+    """
+    Convierte una fecha YYYY-MM-DD.
+    
+    Las fechas con relleno de ceros se convierten sin pasar por strptime;
+    el resto (p. ej. "2024-1-5") se delega a datetime.strptime.
+    
+    Raises:
+        ValueError: Si la fecha no tiene el formato esperado o no existe
+    """
+    if len(fecha) == 10 and fecha[4] == "-" and fecha[7] == "-" and (fecha[:4] + fecha[5:7] + fecha[8:]).isdigit():
+        return date(int(fecha[:4]), int(fecha[5:7]), int(fecha[8:]))
+    return datetime.strptime(fecha, "%Y-%m-%d").date()
+
+
 class ProductoTools:
     """Clase que contiene las herramientas para manejo de productos y devoluciones."""
     
     def __init__(self):
         """Inicializar la clase con datos simulados."""
-        # Base de datos simulada de productos
-        self.productos_db = {
-            "PROD001": {
-                "nombre": "Smartphone EcoTech Pro",
-                "categoria": "Electrónicos",
-                "precio": 299.99,
-                "garantia_dias": 30,
-                "elegible_devolucion": True
-            },
-            "PROD002": {
-                "nombre": "Laptop EcoFriendly",
-                "categoria": "Computadoras",
-                "precio": 899.99,
-                "garantia_dias": 15,
-                "elegible_devolucion": True
-            },
-            "PROD003": {
-                "nombre": "Auriculares Wireless",
-                "categoria": "Audio",
-                "precio": 79.99,
-                "garantia_dias": 14,
-                "elegible_devolucion": True
-            },
-            "PROD004": {
-                "nombre": "Tablet EcoPad",
-                "categoria": "Tablets",
-                "precio": 199.99,
-                "garantia_dias": 7,
-                "elegible_devolucion": False  # Producto no elegible
-            }
-        }
+        # Tablas de solo lectura con IDs internados
+        self.productos_db = MappingProxyType({sys.intern(k): v for k, v in _PRODUCTOS.items()})
+        self.clientes_db = MappingProxyType({sys.intern(k): v for k, v in _CLIENTES.items()})
         
-        # Base de datos simulada de clientes
-        self.clientes_db = {
-            "CLI001": {"nombre": "Juan Pérez", "email": "juan@email.com", "tipo": "premium"},
-            "CLI002": {"nombre": "María García", "email": "maria@email.com", "tipo": "estándar"},
-            "CLI003": {"nombre": "Carlos López", "email": "carlos@email.com", "tipo": "premium"},
-        }
+        # Columnas de productos (SoA) para las verificaciones por lotes (verificar_batch)
+        self._id_to_row = {producto_id: i for i, producto_id in enumerate(self.productos_db)}
+        productos = self.productos_db.values()
+        self._garantia = np.array([p["garantia_dias"] for p in productos], dtype=np.int16)
+        self._elegible = np.array([p["elegible_devolucion"] for p in productos], dtype=bool)
     
     def verificar_elegibilidad_producto(self, producto_id: str, fecha_compra: str) -> str:
         """
@@ -80,10 +160,11 @@ class ProductoTools:
             logger.info(f"Verificando elegibilidad para producto {producto_id} comprado el {fecha_compra}")
             
             # Verificar si el producto existe
-            if producto_id not in self.productos_db:
+            producto = self.productos_db.get(producto_id)
+            if producto is None:
                 return f"❌ Error: El producto {producto_id} no existe en nuestro sistema."
             
-            producto = self.productos_db[producto_id]
+            garantia_dias = producto["garantia_dias"]
             
             # Verificar si el producto es elegible para devolución
             if not producto["elegible_devolucion"]:
@@ -91,22 +172,21 @@ class ProductoTools:
             
             # Calcular días desde la compra
             try:
-                fecha_compra_obj = datetime.strptime(fecha_compra, "%Y-%m-%d")
-                dias_transcurridos = (datetime.now() - fecha_compra_obj).days
+                dias_transcurridos = (date.today() - _parse_fecha(fecha_compra)).days
             except ValueError:
                 return f"❌ Error: Formato de fecha inválido. Use YYYY-MM-DD"
             
             # Verificar si está dentro del período de garantía
-            if dias_transcurridos > producto["garantia_dias"]:
+            if dias_transcurridos > garantia_dias:
                 return f"❌ El producto {producto['nombre']} ({producto_id}) ya no es elegible para devolución. " \
                        f"Han transcurrido {dias_transcurridos} días desde la compra, " \
-                       f"pero el período de devolución es de {producto['garantia_dias']} días."
+                       f"pero el período de devolución es de {garantia_dias} días."
             
             # Verificar condiciones adicionales
-            condiciones_adicionales = self._verificar_condiciones_adicionales(producto_id, dias_transcurridos)
+            condiciones_adicionales = self._verificar_condiciones_adicionales(producto, dias_transcurridos)
             
             resultado = f"✅ El producto {producto['nombre']} ({producto_id}) ES ELEGIBLE para devolución.\n" \
-                      f"📅 Días transcurridos: {dias_transcurridos}/{producto['garantia_dias']}\n" \
+                      f"📅 Días transcurridos: {dias_transcurridos}/{garantia_dias}\n" \
                       f"💰 Precio: ${producto['precio']}\n" \
                       f"📦 Categoría: {producto['categoria']}\n" \
                       f"{condiciones_adicionales}"
@@ -119,6 +199,41 @@ class ProductoTools:
             logger.error(error_msg)
             return error_msg
     
+    def verificar_batch(self, producto_ids: List[str], fechas_compra: List[str]) -> np.ndarray:
+        """
+        Verifica la elegibilidad de varios productos en una sola operación vectorizada.
+        
+        Args:
+            producto_ids (List[str]): IDs de los productos
+            fechas_compra (List[str]): Fechas de compra en formato YYYY-MM-DD
+            
+        Returns:
+            np.ndarray: Máscara booleana; False si el producto no existe,
+                la fecha es inválida o no es elegible
+                
+        Raises:
+            ValueError: Si las listas de IDs y fechas no tienen la misma longitud
+        """
+        if len(producto_ids) != len(fechas_compra):
+            raise ValueError(
+                f"producto_ids y fechas_compra deben tener la misma longitud "
+                f"({len(producto_ids)} != {len(fechas_compra)})"
+            )
+        
+        rows = np.array([self._id_to_row.get(producto_id, -1) for producto_id in producto_ids], dtype=np.intp)
+        dias = np.zeros(len(rows), dtype=np.int64)
+        
+        hoy = date.today()
+        for i, fecha_compra in enumerate(fechas_compra):
+            try:
+                dias[i] = (hoy - _parse_fecha(fecha_compra)).days
+            except ValueError:
+                rows[i] = -1
+        
+        validos = rows >= 0
+        rows = np.where(validos, rows, 0)
+        return validos & self._elegible[rows] & (dias <= self._garantia[rows])
+    
     def generar_etiqueta_devolucion(self, producto_id: str, cliente_id: str) -> str:
         """
         Genera una etiqueta de devolución para un producto y cliente específicos.
@@ -134,18 +249,18 @@ class ProductoTools:
             logger.info(f"Generando etiqueta de devolución para producto {producto_id} y cliente {cliente_id}")
             
             # Verificar que el producto existe
-            if producto_id not in self.productos_db:
+            producto = self.productos_db.get(producto_id)
+            if producto is None:
                 return f"❌ Error: El producto {producto_id} no existe en nuestro sistema."
             
             # Verificar que el cliente existe
-            if cliente_id not in self.clientes_db:
+            cliente = self.clientes_db.get(cliente_id)
+            if cliente is None:
                 return f"❌ Error: El cliente {cliente_id} no existe en nuestro sistema."
             
-            producto = self.productos_db[producto_id]
-            cliente = self.clientes_db[cliente_id]
-            
-            # Generar código único de devolución
-            codigo_devolucion = self._generar_codigo_devolucion()
+            # Generar código único de devolución (un único instante para código y etiqueta)
+            now = datetime.now()
+            codigo_devolucion = self._generar_codigo_devolucion(now)
             
             # Crear etiqueta de devolución
             etiqueta = f"""
@@ -156,7 +271,7 @@ class ProductoTools:
 • Código de Devolución: {codigo_devolucion}
 • Producto: {producto['nombre']} ({producto_id})
 • Cliente: {cliente['nombre']} ({cliente_id})
-• Fecha de Generación: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+• Fecha de Generación: {now.year:04d}-{now.month:02d}-{now.day:02d} {now.hour:02d}:{now.minute:02d}:{now.second:02d}
 
 📦 Instrucciones de Empaque:
 1. Envuelva el producto en su empaque original si está disponible
@@ -198,75 +313,31 @@ class ProductoTools:
         try:
             logger.info(f"Consultando políticas de devolución para categoría: {categoria}")
             
-            politicas_generales = """
-📋 POLÍTICAS GENERALES DE DEVOLUCIÓN
-====================================
-
-⏰ Períodos de Devolución:
-• Electrónicos: 30 días
-• Computadoras: 15 días  
-• Audio: 14 días
-• Tablets: 7 días
-
-✅ Condiciones para Devolución:
-• Producto en estado original
-• Empaque y accesorios incluidos
-• Recibo de compra válido
-• No haber sido usado excesivamente
-
-❌ Productos No Elegibles:
-• Productos personalizados
-• Software con licencia activada
-• Productos de higiene personal
-• Alimentos perecederos
-
-💰 Proceso de Reembolso:
-• Reembolso completo si cumple condiciones
-• Procesamiento en 5-7 días hábiles
-• Mismo método de pago original
-"""
-            
-            if categoria:
-                categoria_politicas = {
-                    "Electrónicos": "📱 Electrónicos: Garantía extendida de 30 días, incluye smartphones, tablets y dispositivos móviles.",
-                    "Computadoras": "💻 Computadoras: Garantía de 15 días, incluye laptops, desktops y componentes.",
-                    "Audio": "🎧 Audio: Garantía de 14 días, incluye auriculares, altavoces y equipos de sonido.",
-                    "Tablets": "📱 Tablets: Garantía de 7 días, dispositivos táctiles y tablets."
-                }
-                
-                if categoria in categoria_politicas:
-                    return f"{politicas_generales}\n\n{categoria_politicas[categoria]}"
-                else:
-                    return f"{politicas_generales}\n\n❓ Categoría '{categoria}' no encontrada. Consulte las categorías disponibles."
+            if not categoria:
+                return _POLITICAS_GENERALES
             
-            return politicas_generales
+            combinada = _POLITICAS_COMBINADAS.get(categoria)
+            if combinada is None:
+                return f"{_POLITICAS_GENERALES}\n\n❓ Categoría '{categoria}' no encontrada. Consulte las categorías disponibles."
+            return combinada
             
         except Exception as e:
             error_msg = f"❌ Error al consultar políticas: {str(e)}"
             logger.error(error_msg)
             return error_msg
     
-    def _verificar_condiciones_adicionales(self, producto_id: str, dias_transcurridos: int) -> str:
+    def _verificar_condiciones_adicionales(self, producto: Dict[str, Any], dias_transcurridos: int) -> str:
         """Verifica condiciones adicionales para la devolución."""
-        producto = self.productos_db[producto_id]
-        
-        condiciones = []
-        
-        # Verificar si es cliente premium
-        if dias_transcurridos > producto["garantia_dias"] * 0.8:
-            condiciones.append("⚠️ Nota: Está cerca del límite del período de devolución.")
-        
-        # Verificar precio alto
-        if producto["precio"] > 500:
-            condiciones.append("💎 Producto de alto valor: Se requiere inspección adicional.")
-        
-        return "\n".join(condiciones) if condiciones else "✅ Todas las condiciones cumplidas."
+        # Cerca del límite del período de devolución (bit 0) / producto de alto valor (bit 1)
+        cerca_limite = dias_transcurridos > producto["garantia_dias"] * 0.8
+        alto_valor = producto["precio"] > 500
+        return _MENSAJES_CONDICIONES[cerca_limite | alto_valor << 1]
     
-    def _generar_codigo_devolucion(self) -> str:
-        """Genera un código único de devolución."""
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-        return f"DEV-{timestamp}-{random_suffix}"
+    def _generar_codigo_devolucion(self, now: Optional[datetime] = None) -> str:
+        """Genera un código único de devolución para el instante indicado (por defecto, ahora)."""
+        now = now or datetime.now()
+        random_suffix = base64.b32encode(os.urandom(3))[:4].decode()
+        return f"DEV-{now.year:04d}{now.month:02d}{now.day:02d}{now.hour:02d}{now.minute:02d}{now.second:02d}-{random_suffix}"
 
 
 # Instancia global de las herramientas
@@ -281,6 +352,14 @@ def verificar_elegibilidad_producto(producto_id: str, fecha_compra: str) -> str:
     return producto_tools.verificar_elegibilidad_producto(producto_id, fecha_compra)
 
 
+def verificar_elegibilidad_batch(producto_ids: List[str], fechas_compra: List[str]) -> List[bool]:
+    """
+    Función wrapper para verificar la elegibilidad de varios productos a la vez.
+    Pensada para procesos por lotes (no es una herramienta del agente).
+    """
+    return producto_tools.verificar_batch(producto_ids, fechas_compra).tolist()
+
+
 def generar_etiqueta_devolucion(producto_id: str, cliente_id: str) -> str:
     """
     Función wrapper para generar etiqueta de devolución.
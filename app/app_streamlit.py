@@ -11,14 +11,61 @@ Fecha: 2024
 """
 
 import streamlit as st
-import os
-import json
-import time
+import re
+import hashlib
+import itertools
+import functools
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple
 
-# Importaciones locales
-from agente import create_eco_agent, EcoAgent
+# Importaciones locales (el paquete agente se importa al crear el primer agente)
+from config import ENABLE_CACHE, CACHE_TTL_SECONDS, OPENAI_TEMPERATURE
+
+if TYPE_CHECKING:
+    from agente import EcoAgent
+    from agente.cache import TTLCache
+
+# Solo se cachean respuestas reproducibles: sin IDs/fechas concretas y con temperatura baja
+# (el agente se crea con OPENAI_TEMPERATURE)
+RESPONSE_CACHE_ENABLED = ENABLE_CACHE and OPENAI_TEMPERATURE <= 0.2
+DYNAMIC_QUERY_PATTERN = re.compile(r"\b(?:PROD|CLI)\d+\b|\d{4}-\d{2}-\d{2}", re.IGNORECASE)
+RESPONSE_CACHE_MAXSIZE = 256
+
+# Agentes distintos (uno por API key) conservados a la vez; los expulsados no se cierran
+# al salir del cache: su logger se libera cuando el recolector ejecuta el finalizador
+MAX_CACHED_AGENTS = 8
+
+# Historial acotado: mensajes conservados en la sesión y mensajes visibles por defecto
+CHAT_HISTORY_MAXLEN = 50
+CHAT_HISTORY_VISIBLE = 20
+
+# Consultas de ejemplo (barra lateral) y ejemplos de la pantalla de bienvenida
+EXAMPLE_QUERIES = [
+    "¿Puedo devolver un smartphone comprado hace 20 días?",
+    "Necesito una etiqueta de devolución para PROD001",
+    "¿Cuáles son las políticas de devolución?",
+    "¿Cómo funciona el proceso de devolución?"
+]
+
+WELCOME_EXAMPLES = {
+    "Verificar Elegibilidad": {
+        "query": "¿Puedo devolver un smartphone que compré hace 20 días?",
+        "description": "Verifica si un producto cumple con los criterios de devolución"
+    },
+    "Generar Etiqueta": {
+        "query": "Necesito una etiqueta de devolución para el producto PROD001 del cliente CLI001",
+        "description": "Genera una etiqueta completa con instrucciones de envío"
+    },
+    "Consultar Políticas": {
+        "query": "¿Cuáles son las políticas de devolución para electrónicos?",
+        "description": "Obtiene información detallada sobre políticas específicas"
+    },
+    "Proceso General": {
+        "query": "¿Cómo funciona el proceso de devolución?",
+        "description": "Explica el proceso completo paso a paso"
+    }
+}
 
 # Configuración de la página
 st.set_page_config(
@@ -28,8 +75,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS personalizado
-st.markdown("""
+# CSS personalizado (se emite en cada ejecución del script: Streamlit elimina
+# los elementos que un rerun no vuelve a dibujar)
+_CSS_HTML = """
 <style>
     .main-header {
         font-size: 3rem;
@@ -71,16 +119,143 @@ st.markdown("""
         margin: 1rem 0;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Pantalla de bienvenida (contenido estático)
+_WELCOME_HTML = """
+<div class="info-box">
+    <h3>👋 ¡Bienvenido a EcoAgent!</h3>
+    <p>EcoAgent es tu asistente inteligente especializado en devoluciones de productos.</p>
+    <p><strong>¿Qué puede hacer EcoAgent?</strong></p>
+    <ul>
+        <li>✅ Verificar si un producto es elegible para devolución</li>
+        <li>🏷️ Generar etiquetas de devolución automáticamente</li>
+        <li>📋 Consultar políticas y procedimientos de devolución</li>
+        <li>🔍 Responder preguntas usando información contextual</li>
+    </ul>
+    <p><strong>Para comenzar:</strong></p>
+    <ol>
+        <li>Configura tu API Key de OpenAI en la barra lateral (opcional)</li>
+        <li>Haz clic en "Inicializar EcoAgent"</li>
+        <li>¡Comienza a hacer consultas!</li>
+    </ol>
+</div>
+"""
+
+
+@st.cache_resource(max_entries=MAX_CACHED_AGENTS, show_spinner=False)
+def _get_agent(api_key: Optional[str]) -> "EcoAgent":
+    """Crea el EcoAgent una sola vez por API key y lo comparte entre reruns y sesiones."""
+    # Importación diferida: LangChain/OpenAI no se cargan hasta inicializar el agente
+    from agente import create_eco_agent
+    
+    return create_eco_agent(api_key, temperature=OPENAI_TEMPERATURE)
+
+
+@st.cache_resource(show_spinner=False)
+def _response_cache() -> "TTLCache":
+    """
+    Respuestas completas de consultas reproducibles, compartidas entre sesiones.
+    
+    Se rellena al terminar el streaming de una consulta, de modo que un fallo
+    de cache sigue mostrando la respuesta token a token.
+    """
+    from agente.cache import TTLCache
+    
+    return TTLCache(maxsize=RESPONSE_CACHE_MAXSIZE, ttl=CACHE_TTL_SECONDS)
+
+
+def _response_cache_key(query: str, model_type: str, api_key: Optional[str]) -> str:
+    """
+    Clave del cache de respuestas.
+    
+    Args:
+        query (str): Consulta del usuario
+        model_type (str): Tipo de modelo del agente ("openai" o "simulated")
+        api_key (str): API key del agente (solo se usa su huella)
+        
+    Returns:
+        str: Clave que separa las respuestas por consulta, modelo y API key
+    """
+    from agente.cache import query_hash
+    
+    return f"{model_type}:{_api_key_hash(api_key)}:{query_hash(query)}"
+
+
+def _api_key_hash(api_key: Optional[str]) -> str:
+    """Huella SHA-256 de la API key, para usarla en claves de cache sin guardarla."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _agent_stats(counters: Tuple[int, int, int], api_key_hash: str, _agent: "EcoAgent") -> Dict[str, Any]:
+    """
+    Estadísticas del agente memoizadas por sus contadores de interacciones.
+    
+    Todo lo que devuelve get_stats() depende solo de la API key (agente en
+    cache, tipo de modelo) y de los contadores, por lo que un agente recreado
+    para la misma key nunca recibe datos de otro distinto.
+    
+    Args:
+        counters (Tuple[int, int, int]): Interacciones totales, exitosas y errores
+            (una consulta en curso cambia primero el total y luego otro contador)
+        api_key_hash (str): Huella de la API key del agente
+        _agent (EcoAgent): Agente (no forma parte de la clave del cache)
+        
+    Returns:
+        Dict[str, Any]: Resultado de get_stats()
+    """
+    return _agent.get_stats()
+
+
+@functools.lru_cache(maxsize=256)
+def _format_success_rate(successful: int, total: int) -> str:
+    """
+    Formatea la tasa de éxito; mientras los contadores no cambien devuelve el mismo string.
+    
+    Args:
+        successful (int): Consultas exitosas
+        total (int): Consultas totales
+        
+    Returns:
+        str: Porcentaje con un decimal
+    """
+    return f"{successful / max(total, 1) * 100:.1f}%"
+
+
+def _use_example_query():
+    """Copia el ejemplo elegido al campo de consulta y reinicia el selector."""
+    st.session_state.example_query = st.session_state.example_choice
+    st.session_state.example_choice = ""
+
+
+def _is_cacheable(query: str) -> bool:
+    """Indica si la respuesta a la consulta puede reutilizarse."""
+    return RESPONSE_CACHE_ENABLED and not DYNAMIC_QUERY_PATTERN.search(query)
 
 
 class EcoAgentApp:
     """Clase principal de la aplicación Streamlit."""
     
+    __slots__ = ("agent", "history_container")
+    
     def __init__(self):
         """Inicializar la aplicación."""
-        self.agent = None
         self.initialize_session_state()
+        
+        # El agente vive en el cache de recursos; cada rerun solo recupera la referencia
+        self.agent = _get_agent(self._api_key()) if st.session_state.agent_initialized else None
+    
+    @staticmethod
+    def _api_key() -> Optional[str]:
+        """API key configurada en la sesión (None si está vacía)."""
+        return st.session_state.get('openai_api_key') or None
+    
+    def _current_stats(self) -> Dict[str, Any]:
+        """Estadísticas del agente; solo se recalculan tras una nueva interacción."""
+        stats = self.agent.stats
+        counters = (stats["total_interactions"], stats["successful_interactions"], stats["errors"])
+        return _agent_stats(counters, _api_key_hash(self._api_key()), self.agent)
     
     def initialize_session_state(self):
         """Inicializar el estado de la sesión."""
@@ -88,7 +263,7 @@ class EcoAgentApp:
             st.session_state.agent_initialized = False
         
         if 'chat_history' not in st.session_state:
-            st.session_state.chat_history = []
+            st.session_state.chat_history = deque(maxlen=CHAT_HISTORY_MAXLEN)
         
         if 'stats' not in st.session_state:
             st.session_state.stats = {
@@ -101,11 +276,8 @@ class EcoAgentApp:
         """Inicializar el agente."""
         try:
             with st.spinner("🤖 Inicializando EcoAgent..."):
-                # Obtener API key de OpenAI
-                openai_api_key = st.session_state.get('openai_api_key')
-                
-                # Crear agente
-                self.agent = create_eco_agent(openai_api_key)
+                # Crear agente (o reutilizar el ya creado para esta API key)
+                self.agent = _get_agent(self._api_key())
                 st.session_state.agent_initialized = True
                 
                 st.success("✅ EcoAgent inicializado correctamente!")
@@ -130,9 +302,8 @@ class EcoAgentApp:
             st.metric("Consultas Totales", st.session_state.stats["total_queries"])
         
         with col3:
-            success_rate = (st.session_state.stats["successful_queries"] / 
-                          max(st.session_state.stats["total_queries"], 1)) * 100
-            st.metric("Tasa de Éxito", f"{success_rate:.1f}%")
+            stats = st.session_state.stats
+            st.metric("Tasa de Éxito", _format_success_rate(stats["successful_queries"], stats["total_queries"]))
     
     def render_sidebar(self):
         """Renderizar la barra lateral."""
@@ -147,9 +318,11 @@ class EcoAgentApp:
             help="Ingresa tu clave API de OpenAI para usar modelos reales"
         )
         
-        if openai_api_key != st.session_state.get('openai_api_key'):
+        if openai_api_key != (st.session_state.get('openai_api_key') or ''):
             st.session_state.openai_api_key = openai_api_key
-            st.session_state.agent_initialized = False
+            # El agente se cachea por API key: otras sesiones conservan el suyo
+            if st.session_state.agent_initialized:
+                self.agent = _get_agent(self._api_key())
         
         # Botón de inicialización
         if not st.session_state.agent_initialized:
@@ -157,13 +330,14 @@ class EcoAgentApp:
                 self.initialize_agent()
         else:
             if st.sidebar.button("🔄 Reinicializar EcoAgent"):
+                # Solo se reinicia esta sesión; el agente compartido sigue en cache
                 st.session_state.agent_initialized = False
                 st.rerun()
         
         # Información del agente
         if st.session_state.agent_initialized and self.agent:
             st.sidebar.subheader("📊 Información del Agente")
-            stats = self.agent.get_stats()
+            stats = self._current_stats()
             
             st.sidebar.write(f"**Modelo:** {stats['model_type']}")
             st.sidebar.write(f"**Herramientas:** {stats['tools_available']}")
@@ -172,20 +346,20 @@ class EcoAgentApp:
         
         # Ejemplos de consultas
         st.sidebar.subheader("💡 Ejemplos de Consultas")
-        example_queries = [
-            "¿Puedo devolver un smartphone comprado hace 20 días?",
-            "Necesito una etiqueta de devolución para PROD001",
-            "¿Cuáles son las políticas de devolución?",
-            "¿Cómo funciona el proceso de devolución?"
-        ]
+        st.sidebar.selectbox(
+            "📝 Ejemplo",
+            [""] + EXAMPLE_QUERIES,
+            key="example_choice",
+            on_change=_use_example_query
+        )
         
-        for query in example_queries:
-            if st.sidebar.button(f"📝 {query}", key=f"example_{query}"):
-                st.session_state.example_query = query
+        # Metadatos de cada respuesta (desactivados por defecto)
+        st.sidebar.checkbox("Mostrar metadatos", value=False, key="show_metadata")
         
         # Limpiar historial
         if st.sidebar.button("🗑️ Limpiar Historial"):
-            st.session_state.chat_history = []
+            st.session_state.chat_history.clear()
+            st.session_state.show_full_history = False
             st.rerun()
     
     def render_chat_interface(self):
@@ -226,10 +400,35 @@ class EcoAgentApp:
             # Actualizar estadísticas
             st.session_state.stats["total_queries"] += 1
             
-            # Mostrar spinner
-            with st.spinner("🤖 EcoAgent está procesando tu consulta..."):
-                # Procesar consulta
-                result = self.agent.process_query(query)
+            # El nuevo turno se añade al final de la conversación ya renderizada
+            with self.history_container:
+                st.chat_message("user").write(query)
+                
+                with st.chat_message("assistant"):
+                    # Consultas reproducibles (FAQ, ejemplos): se reutiliza la respuesta completa
+                    cache_key = None
+                    if _is_cacheable(query):
+                        cache_key = _response_cache_key(query, self._current_stats()["model_type"], self._api_key())
+                    cached = _response_cache().get(cache_key) if cache_key else None
+                    
+                    if cached is not None:
+                        result = {**cached, "timestamp": datetime.now().isoformat(), "stats": self.agent.stats}
+                        streamed = False
+                    else:
+                        result = self._stream_response(query)
+                        streamed = True
+                        # Solo se guardan respuestas correctas: un error no se repite durante todo el TTL
+                        if cache_key and result["agent_status"] == "success":
+                            _response_cache().set(cache_key, {
+                                "response": result["response"],
+                                "user_input": query,
+                                "agent_status": "success",
+                                "tools_available": result["tools_available"],
+                                "cache_hit": True
+                            })
+                    
+                    # Mostrar respuesta (si se transmitió en streaming, solo los metadatos)
+                    self.display_response(result, streamed=streamed)
             
             # Actualizar estadísticas
             if result["agent_status"] == "success":
@@ -237,66 +436,94 @@ class EcoAgentApp:
             else:
                 st.session_state.stats["errors"] += 1
             
-            # Agregar al historial
-            st.session_state.chat_history.append({
-                "timestamp": datetime.now().isoformat(),
-                "query": query,
-                "response": result["response"],
-                "status": result["agent_status"]
-            })
-            
-            # Mostrar respuesta
-            self.display_response(result)
-            
+            # Agregar al historial (solo rol y contenido)
+            st.session_state.chat_history.append(("user", query))
+            st.session_state.chat_history.append(("assistant", result["response"]))
+            st.session_state.live_turns = 2
+        
         except Exception as e:
             st.error(f"❌ Error al procesar consulta: {str(e)}")
             st.session_state.stats["errors"] += 1
     
-    def display_response(self, result: Dict[str, Any]):
-        """Mostrar la respuesta del agente."""
-        st.markdown("---")
+    def _stream_response(self, query: str) -> Dict[str, Any]:
+        """Muestra la respuesta del agente token a token y devuelve el resultado."""
+        status: Dict[str, Any] = {}
         
-        if result["agent_status"] == "success":
-            st.markdown('<div class="success-box">', unsafe_allow_html=True)
-            st.markdown("### ✅ Respuesta del EcoAgent")
-            st.write(result["response"])
-            st.markdown('</div>', unsafe_allow_html=True)
-        else:
-            st.markdown('<div class="error-box">', unsafe_allow_html=True)
-            st.markdown("### ❌ Error en la Consulta")
+        def text_chunks(chunks):
+            # El último elemento es el estado de esta consulta, no texto
+            for chunk in chunks:
+                if isinstance(chunk, dict):
+                    status.update(chunk)
+                else:
+                    yield chunk
+        
+        # El spinner solo cubre la planificación y las herramientas (antes del primer token)
+        tokens = text_chunks(self.agent.stream_query(query, with_status=True))
+        with st.spinner("🤖 EcoAgent está procesando tu consulta..."):
+            first_token = next(tokens, "")
+        
+        # Mostrar la respuesta a medida que se genera
+        response = st.write_stream(itertools.chain([first_token], tokens))
+        
+        return {
+            "response": response,
+            "timestamp": datetime.now().isoformat(),
+            "user_input": query,
+            "tools_available": len(self.agent.tools),
+            "agent_status": "error",
+            **status
+        }
+    
+    def display_response(self, result: Dict[str, Any], streamed: bool = False):
+        """
+        Mostrar la respuesta del agente dentro del mensaje del asistente.
+        
+        Args:
+            result (Dict[str, Any]): Resultado de la consulta
+            streamed (bool): Si el texto ya se mostró en streaming (solo se muestran los metadatos)
+        """
+        if not streamed:
             st.write(result["response"])
+        
+        if result["agent_status"] != "success":
+            st.error("❌ Error en la Consulta")
             if "error" in result:
                 st.write(f"**Detalles del error:** {result['error']}")
-            st.markdown('</div>', unsafe_allow_html=True)
         
-        # Mostrar metadatos
-        with st.expander("📊 Información de la Consulta"):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.write(f"**Timestamp:** {result['timestamp']}")
-                st.write(f"**Estado:** {result['agent_status']}")
-                st.write(f"**Herramientas disponibles:** {result['tools_available']}")
-            
-            with col2:
-                if 'stats' in result:
-                    stats = result['stats']
-                    st.write(f"**Interacciones totales:** {stats['total_interactions']}")
-                    st.write(f"**Interacciones exitosas:** {stats['successful_interactions']}")
-                    st.write(f"**Errores:** {stats['errors']}")
+        # Mostrar metadatos (solo si se activaron en la barra lateral)
+        if st.session_state.get("show_metadata"):
+            with st.expander("📊 Información de la Consulta"):
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.write(f"**Timestamp:** {result['timestamp']}")
+                    st.write(f"**Estado:** {result['agent_status']}")
+                    st.write(f"**Herramientas disponibles:** {result['tools_available']}")
+                
+                with col2:
+                    if 'stats' in result:
+                        stats = result['stats']
+                        st.write(f"**Interacciones totales:** {stats['total_interactions']}")
+                        st.write(f"**Interacciones exitosas:** {stats['successful_interactions']}")
+                        st.write(f"**Errores:** {stats['errors']}")
     
+    @st.fragment
     def render_chat_history(self):
-        """Renderizar el historial de chat."""
-        if st.session_state.chat_history:
-            st.subheader("📜 Historial de Conversación")
-            
-            # Mostrar historial en orden inverso (más reciente primero)
-            for i, entry in enumerate(reversed(st.session_state.chat_history)):
-                with st.expander(f"💬 Consulta {len(st.session_state.chat_history) - i}: {entry['query'][:50]}..."):
-                    st.write(f"**Consulta:** {entry['query']}")
-                    st.write(f"**Respuesta:** {entry['response']}")
-                    st.write(f"**Estado:** {entry['status']}")
-                    st.write(f"**Timestamp:** {entry['timestamp']}")
+        """Renderizar el historial de chat como mensajes en orden cronológico."""
+        st.subheader("📜 Historial de Conversación")
+        
+        history = st.session_state.chat_history
+        # Los turnos de esta ejecución ya están en el contenedor exterior: no se duplican al recargar el fragmento
+        shown = max(len(history) - st.session_state.get('live_turns', 0), 0)
+        hidden = 0 if st.session_state.get('show_full_history') else max(shown - CHAT_HISTORY_VISIBLE, 0)
+        
+        # Los mensajes antiguos solo se dibujan a petición (el botón recarga solo este fragmento)
+        if hidden and st.button(f"⬆️ Mostrar {hidden} mensajes anteriores", key="show_more_history"):
+            st.session_state.show_full_history = True
+            hidden = 0
+        
+        for role, content in itertools.islice(history, hidden, shown):
+            st.chat_message(role).write(content)
     
     def render_agent_info(self):
         """Renderizar información del agente."""
@@ -318,81 +545,46 @@ class EcoAgentApp:
             
             with col2:
                 st.markdown("### 📈 Estadísticas del Agente")
-                stats = self.agent.get_stats()
+                stats = self._current_stats()
                 
                 st.metric("Interacciones Totales", stats['total_interactions'])
-                st.metric("Tasa de Éxito", f"{(stats['successful_interactions'] / max(stats['total_interactions'], 1)) * 100:.1f}%")
+                st.metric("Tasa de Éxito", _format_success_rate(stats['successful_interactions'], stats['total_interactions']))
                 st.metric("Tipo de Modelo", stats['model_type'])
                 st.metric("RAG Disponible", "✅" if stats['rag_available'] else "❌")
     
     def run(self):
         """Ejecutar la aplicación."""
+        st.markdown(_CSS_HTML, unsafe_allow_html=True)
+        
         # Renderizar componentes
         self.render_header()
         self.render_sidebar()
         
         # Contenido principal
         if st.session_state.agent_initialized:
+            # Historial de chat (antes de la entrada, donde se añadirá el nuevo turno)
+            st.session_state.live_turns = 0
+            self.render_chat_history()
+            
+            # Fuera del fragmento: una ejecución completa escribe aquí el nuevo turno
+            self.history_container = st.container()
+            
             # Interfaz de chat
             self.render_chat_interface()
             
-            # Historial de chat
-            self.render_chat_history()
-            
             # Información del agente
             self.render_agent_info()
         else:
             # Pantalla de bienvenida
-            st.markdown("""
-            <div class="info-box">
-                <h3>👋 ¡Bienvenido a EcoAgent!</h3>
-                <p>EcoAgent es tu asistente inteligente especializado en devoluciones de productos.</p>
-                <p><strong>¿Qué puede hacer EcoAgent?</strong></p>
-                <ul>
-                    <li>✅ Verificar si un producto es elegible para devolución</li>
-                    <li>🏷️ Generar etiquetas de devolución automáticamente</li>
-                    <li>📋 Consultar políticas y procedimientos de devolución</li>
-                    <li>🔍 Responder preguntas usando información contextual</li>
-                </ul>
-                <p><strong>Para comenzar:</strong></p>
-                <ol>
-                    <li>Configura tu API Key de OpenAI en la barra lateral (opcional)</li>
-                    <li>Haz clic en "Inicializar EcoAgent"</li>
-                    <li>¡Comienza a hacer consultas!</li>
-                </ol>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(_WELCOME_HTML, unsafe_allow_html=True)
             
             # Mostrar ejemplos
             st.subheader("💡 Ejemplos de Consultas")
             
-            examples = [
-                {
-                    "title": "Verificar Elegibilidad",
-                    "query": "¿Puedo devolver un smartphone que compré hace 20 días?",
-                    "description": "Verifica si un producto cumple con los criterios de devolución"
-                },
-                {
-                    "title": "Generar Etiqueta",
-                    "query": "Necesito una etiqueta de devolución para el producto PROD001 del cliente CLI001",
-                    "description": "Genera una etiqueta completa con instrucciones de envío"
-                },
-                {
-                    "title": "Consultar Políticas",
-                    "query": "¿Cuáles son las políticas de devolución para electrónicos?",
-                    "description": "Obtiene información detallada sobre políticas específicas"
-                },
-                {
-                    "title": "Proceso General",
-                    "query": "¿Cómo funciona el proceso de devolución?",
-                    "description": "Explica el proceso completo paso a paso"
-                }
-            ]
-            
-            for i, example in enumerate(examples):
-                with st.expander(f"📝 {example['title']}"):
-                    st.write(f"**Consulta:** {example['query']}")
-                    st.write(f"**Descripción:** {example['description']}")
+            title = st.radio("Ejemplo", list(WELCOME_EXAMPLES), horizontal=True, label_visibility="collapsed")
+            example = WELCOME_EXAMPLES[title]
+            st.write(f"**Consulta:** {example['query']}")
+            st.write(f"**Descripción:** {example['description']}")
 
 
 def main():
@@ -10,7 +10,7 @@ Fecha: 2024
 """
 
 from agente import create_eco_agent
-import json
+import asyncio
 from datetime import datetime, timedelta
 
 def ejemplo_basico():
@@ -30,8 +30,8 @@ def ejemplo_basico():
     print(f"📊 Estado: {result['agent_status']}")
     print()
 
-def ejemplo_verificacion_elegibilidad():
-    """Ejemplo de verificación de elegibilidad."""
+async def ejemplo_verificacion_elegibilidad():
+    """Ejemplo de verificación de elegibilidad (escenarios en paralelo)."""
     print("🔍 Ejemplo: Verificación de Elegibilidad")
     print("=" * 40)
     
@@ -56,11 +56,14 @@ def ejemplo_verificacion_elegibilidad():
         }
     ]
     
-    for escenario in escenarios:
-        query = f"¿Puedo devolver el producto {escenario['producto']} comprado el {escenario['fecha']}?"
+    queries = [
+        f"¿Puedo devolver el producto {escenario['producto']} comprado el {escenario['fecha']}?"
+        for escenario in escenarios
+    ]
+    results = await asyncio.gather(*(agent.aprocess_query(query) for query in queries))
+    
+    for query, result in zip(queries, results):
         print(f"👤 Consulta: {query}")
-        
-        result = agent.process_query(query)
         print(f"🤖 Respuesta: {result['response']}")
         print("-" * 40)
 
@@ -79,8 +82,8 @@ def ejemplo_generacion_etiqueta():
     print(f"🤖 Respuesta: {result['response']}")
     print()
 
-def ejemplo_consulta_politicas():
-    """Ejemplo de consulta de políticas."""
+async def ejemplo_consulta_politicas():
+    """Ejemplo de consulta de políticas (consultas en paralelo)."""
     print("📋 Ejemplo: Consulta de Políticas")
     print("=" * 40)
     
@@ -93,14 +96,15 @@ def ejemplo_consulta_politicas():
         "¿Qué productos no son elegibles para devolución?"
     ]
     
-    for politica in politicas:
+    results = await asyncio.gather(*(agent.aprocess_query(politica) for politica in politicas))
+    
+    for politica, result in zip(politicas, results):
         print(f"👤 Consulta: {politica}")
-        result = agent.process_query(politica)
         print(f"🤖 Respuesta: {result['response']}")
         print("-" * 40)
 
-def ejemplo_consulta_rag():
-    """Ejemplo de consultas RAG."""
+async def ejemplo_consulta_rag():
+    """Ejemplo de consultas RAG (consultas en paralelo)."""
     print("🔍 Ejemplo: Consultas RAG")
     print("=" * 40)
     
@@ -113,14 +117,15 @@ def ejemplo_consulta_rag():
         "¿Cómo puedo contactar soporte técnico?"
     ]
     
-    for consulta in consultas_rag:
+    results = await asyncio.gather(*(agent.aprocess_query(consulta) for consulta in consultas_rag))
+    
+    for consulta, result in zip(consultas_rag, results):
         print(f"👤 Consulta: {consulta}")
-        result = agent.process_query(consulta)
         print(f"🤖 Respuesta: {result['response']}")
         print("-" * 40)
 
 def ejemplo_flujo_completo():
-    """Ejemplo de flujo completo de devolución."""
+    """Ejemplo de flujo completo de devolución (secuencial: cada paso depende del anterior)."""
     print("🔄 Ejemplo: Flujo Completo de Devolución")
     print("=" * 40)
     
@@ -161,13 +166,13 @@ def ejemplo_estadisticas():
         "Genera una etiqueta para PROD002"
     ]
     
-    for consulta in consultas:
-        agent.process_query(consulta)
+    agent.process_queries_batch(consultas)
     
     # Obtener estadísticas
     stats = agent.get_stats()
     print("📈 Estadísticas del Agente:")
-    print(json.dumps(stats, indent=2, ensure_ascii=False))
+    for clave, valor in stats.items():
+        print(f"  {clave}: {valor}")
 
 def ejemplo_manejo_errores():
     """Ejemplo de manejo de errores."""
@@ -192,17 +197,17 @@ def ejemplo_manejo_errores():
             print(f"❌ Error: {result.get('error', 'Error desconocido')}")
         print("-" * 40)
 
-def main():
+async def main_async():
     """Ejecutar todos los ejemplos."""
     print("🚀 Ejecutando Ejemplos de EcoAgent")
     print("=" * 50)
     
     try:
         ejemplo_basico()
-        ejemplo_verificacion_elegibilidad()
+        await ejemplo_verificacion_elegibilidad()
         ejemplo_generacion_etiqueta()
-        ejemplo_consulta_politicas()
-        ejemplo_consulta_rag()
+        await ejemplo_consulta_politicas()
+        await ejemplo_consulta_rag()
         ejemplo_flujo_completo()
         ejemplo_estadisticas()
         ejemplo_manejo_errores()
@@ -212,5 +217,9 @@ def main():
     except Exception as e:
         print(f"❌ Error ejecutando ejemplos: {e}")
 
+def main():
+    """Punto de entrada síncrono."""
+    asyncio.run(main_async())
+
 if __name__ == "__main__":
     main()
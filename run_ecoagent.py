@@ -11,37 +11,37 @@ Uso:
 """
 
 import argparse
+import importlib.util
+import subprocess
 import sys
 import os
-from pathlib import Path
 
 def setup_environment():
     """Configurar el entorno para EcoAgent."""
     print("🔧 Configurando entorno...")
     
     # Crear directorios necesarios
-    directories = ["logs", "data", "temp"]
-    for directory in directories:
-        Path(directory).mkdir(exist_ok=True)
+    for directory in ("logs", "data", "temp"):
+        os.makedirs(directory, exist_ok=True)
         print(f"✅ Directorio {directory} creado/verificado")
     
-    # Verificar archivos de datos
-    data_files = ["data/faq.json", "data/politicas_devolucion.txt"]
-    for file_path in data_files:
-        if not Path(file_path).exists():
-            print(f"⚠️  Archivo {file_path} no encontrado")
+    # Verificar archivos de datos (un único listado del directorio)
+    existing = {entry.name for entry in os.scandir("data")}
+    for name in ("faq.json", "politicas_devolucion.txt"):
+        if name not in existing:
+            print(f"⚠️  Archivo data/{name} no encontrado")
         else:
-            print(f"✅ Archivo {file_path} verificado")
+            print(f"✅ Archivo data/{name} verificado")
 
 def run_streamlit():
     """Ejecutar la aplicación Streamlit."""
     print("🚀 Iniciando aplicación Streamlit...")
-    try:
-        import streamlit
-        os.system("streamlit run app/app_streamlit.py")
-    except ImportError:
+    # Solo se comprueba que esté instalado; importarlo aquí no sirve al proceso hijo
+    if importlib.util.find_spec("streamlit") is None:
         print("❌ Streamlit no está instalado. Ejecuta: pip install streamlit")
         sys.exit(1)
+    
+    sys.exit(subprocess.run([sys.executable, "-m", "streamlit", "run", "app/app_streamlit.py"], check=False).returncode)
 
 def run_cli():
     """Ejecutar EcoAgent en modo CLI."""
@@ -69,12 +69,17 @@ def run_cli():
                     continue
                 
                 print("🤖 EcoAgent procesando...")
-                result = agent.process_query(user_input)
-                
-                print(f"\n🤖 EcoAgent: {result['response']}")
+                print("\n🤖 EcoAgent: ", end="", flush=True)
                 
-                if result['agent_status'] == 'error':
-                    print(f"❌ Error: {result.get('error', 'Error desconocido')}")
+                # La respuesta se imprime a medida que se genera; Ctrl-C la interrumpe
+                tokens = agent.stream_query(user_input)
+                try:
+                    for token in tokens:
+                        print(token, end="", flush=True)
+                    print()
+                except KeyboardInterrupt:
+                    tokens.close()
+                    print("\n⏹️ Respuesta interrumpida")
                 
             except KeyboardInterrupt:
                 print("\n👋 ¡Hasta luego!")
@@ -89,12 +94,11 @@ def run_cli():
 def run_tests():
     """Ejecutar pruebas del sistema."""
     print("🧪 Ejecutando pruebas del sistema...")
-    try:
-        import pytest
-        os.system("pytest tests/ -v")
-    except ImportError:
+    if importlib.util.find_spec("pytest") is None:
         print("❌ pytest no está instalado. Ejecuta: pip install pytest")
         sys.exit(1)
+    
+    sys.exit(subprocess.run([sys.executable, "-m", "pytest", "tests/", "-v"], check=False).returncode)
 
 def main():
     """Función principal."""
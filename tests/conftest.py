@@ -0,0 +1,11 @@
+"""
+Configuración común de las pruebas de EcoAgent.
+
+Permite ejecutar `pytest tests/` desde la raíz del repositorio sin instalar
+el paquete.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,75 @@
+"""
+Pruebas de los caches de EcoAgent (agente/cache.py).
+"""
+
+import numpy as np
+
+from agente.cache import SemanticCache, TTLCache, cosine_similarities, query_hash
+
+
+def test_ttl_cache_devuelve_valores_vigentes():
+    cache = TTLCache(maxsize=4, ttl=60)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b", "defecto") == "defecto"
+
+
+def test_ttl_cache_expira_entradas():
+    cache = TTLCache(maxsize=4, ttl=-1)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_expulsa_la_entrada_menos_usada():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_query_hash_ignora_mayusculas_y_espacios():
+    assert query_hash("  Hola   Mundo ") == query_hash("hola mundo")
+
+
+def test_cosine_similarities():
+    matrix = np.eye(3, dtype=np.float32)
+    sims = cosine_similarities(matrix, np.array([1, 0, 0], dtype=np.float32))
+
+    assert np.allclose(sims, [1, 0, 0])
+
+
+def test_semantic_cache_acierta_por_similitud():
+    cache = SemanticCache(threshold=0.95, maxsize=4)
+    cache.add([1.0, 0.0], "respuesta")
+
+    assert cache.lookup([0.99, 0.01]) == "respuesta"
+    assert cache.lookup([0.0, 1.0]) is None
+
+
+def test_semantic_cache_reemplaza_la_entrada_menos_usada():
+    cache = SemanticCache(threshold=0.95, maxsize=2)
+    cache.add([1.0, 0.0, 0.0], "x")
+    cache.add([0.0, 1.0, 0.0], "y")
+    cache.lookup([1.0, 0.0, 0.0])
+    cache.add([0.0, 0.0, 1.0], "z")
+
+    assert len(cache) == 2
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.lookup([1.0, 0.0, 0.0]) == "x"
+    assert cache.lookup([0.0, 0.0, 1.0]) == "z"
+
+
+def test_semantic_cache_clear():
+    cache = SemanticCache()
+    cache.add([1.0, 0.0], "x")
+    cache.clear()
+
+    assert cache.lookup([1.0, 0.0]) is None
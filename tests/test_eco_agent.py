@@ -0,0 +1,316 @@
+"""
+Pruebas del EcoAgent (agente/eco_agent.py).
+"""
+
+import asyncio
+import gc
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from agente.eco_agent import _OPEN_LOGGERS, EcoAgent, EcoAgentLogger
+from agente.planner import LLMCompilerAgent
+from agente.tools import _POLITICAS_GENERALES
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    """Agente sin LLM ni RAG; los logs se escriben en un directorio temporal."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    agent = EcoAgent()
+    yield agent
+    agent.close()
+
+
+def test_consultas_identicas_en_curso_se_ejecutan_una_vez(agent):
+    calls = []
+
+    async def fake_run(user_input):
+        calls.append(user_input)
+        await asyncio.sleep(0.05)
+        return f"respuesta a {user_input}"
+
+    agent._arun_agent = fake_run
+
+    async def scenario():
+        return await asyncio.gather(
+            agent._arun_coalesced("clave", "consulta"),
+            agent._arun_coalesced("clave", "consulta"),
+            agent._arun_coalesced("otra", "otra consulta"),
+        )
+
+    results = asyncio.run(scenario())
+
+    assert calls == ["consulta", "otra consulta"]
+    assert results[0] == ("respuesta a consulta", True)
+    assert results[1] == ("respuesta a consulta", False)
+    assert agent._inflight == {}
+
+
+def test_error_se_comparte_con_las_consultas_en_espera(agent):
+    async def failing_run(user_input):
+        await asyncio.sleep(0.05)
+        raise RuntimeError("fallo")
+
+    agent._arun_agent = failing_run
+
+    async def scenario():
+        return await asyncio.gather(
+            agent._arun_coalesced("clave", "consulta"),
+            agent._arun_coalesced("clave", "consulta"),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert agent._inflight == {}
+
+
+def test_process_queries_batch_reutiliza_el_resultado(agent):
+    calls = []
+
+    async def fake_run(user_input):
+        calls.append(user_input)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    agent._arun_agent = fake_run
+
+    results = agent.process_queries_batch(["¿Cómo devuelvo algo?"] * 3)
+
+    assert calls == ["¿Cómo devuelvo algo?"]
+    assert [result["response"] for result in results] == ["ok"] * 3
+
+
+def test_logger_no_descarta_el_lote_por_una_entrada_invalida(tmp_path):
+    log_file = tmp_path / "interacciones.log"
+    logger = EcoAgentLogger(log_file=str(log_file))
+
+    logger._write_log({"type": "ok", "valor": 1})
+    logger._write_log({"type": "objeto", "valor": object()})
+    logger._write_log({("clave", "no", "str"): 1})
+    logger._write_log({"type": "ok", "valor": 2})
+    logger.close()
+    logger._worker.join(timeout=5)
+
+    entries = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [entry["type"] for entry in entries] == ["ok", "objeto", "ok"]
+    assert entries[1]["valor"].startswith("<object object")
+
+
+def test_logger_sobrevive_a_errores_de_escritura(tmp_path, monkeypatch):
+    log_file = tmp_path / "interacciones.log"
+    original_open = EcoAgentLogger._open_log_file
+    failures = []
+
+    def flaky_open(self):
+        write_batch, close_file = original_open(self)
+
+        def flaky_write(batch):
+            if not failures:
+                failures.append(batch)
+                raise OSError("disco lleno")
+            write_batch(batch)
+
+        return flaky_write, close_file
+
+    monkeypatch.setattr(EcoAgentLogger, "_open_log_file", flaky_open)
+    logger = EcoAgentLogger(log_file=str(log_file), flush_every=1)
+
+    logger._write_log({"type": "perdida"})
+    logger._write_log({"type": "ok"})
+    logger.close()
+    logger._worker.join(timeout=5)
+
+    assert failures
+    assert [json.loads(line)["type"] for line in log_file.read_text().splitlines()] == ["ok"]
+
+
+def test_rag_query_solo_guarda_respuestas_exitosas(agent):
+    responses = [
+        {"result": "Error al procesar la consulta: timeout", "status": "error"},
+        {"result": "Tienes 30 días", "status": "success"},
+    ]
+    calls = []
+
+    def fake_query(question):
+        calls.append(question)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    agent.rag_pipeline = SimpleNamespace(query=fake_query)
+
+    assert agent._rag_query("plazo").startswith("Error")
+    assert agent._rag_query("plazo") == "Tienes 30 días"
+    assert agent._rag_query("plazo") == "Tienes 30 días"
+    assert len(calls) == 2
+
+
+def test_consultas_informativas_usan_un_plan_con_datos():
+    assert EcoAgent._classify("Hola") == "GREETING"
+    assert EcoAgent._classify("¿Cuáles son las políticas para laptops?") == "INFO"
+
+    plan = EcoAgent._grounding_plan("¿Cuáles son las políticas para laptops?")
+
+    assert [node["tool"] for node in plan] == ["Consultar Políticas de Devolución", "Consulta RAG"]
+    assert plan[0]["args"] == ["Computadoras"]
+    assert EcoAgent._grounding_plan("¿Cómo funciona?")[0]["args"] == []
+
+
+@pytest.mark.parametrize("prompt, intent", [
+    ("Necesito ayuda con la política de devolución", "devolucion"),
+    ("Soporte: ¿qué política aplica?", "politica"),
+    ("Necesito ayuda", "soporte"),
+    ("Buenas tardes", None),
+])
+def test_llm_simulado_respeta_la_prioridad_de_intenciones(agent, prompt, intent):
+    llm = agent._create_simulated_llm()
+
+    assert llm(prompt) == llm._RESPONSES.get(intent, llm._DEFAULT)
+
+
+def test_llm_simulado_ignora_los_resultados_al_elegir_la_intencion(agent):
+    llm = agent._create_simulated_llm()
+
+    answer = llm(f"Necesito ayuda\n{LLMCompilerAgent.RESULTS_HEADER}\n[1] Política: devolución en 30 días")
+
+    assert answer.startswith(llm._RESPONSES["soporte"])
+    assert answer.endswith("[1] Política: devolución en 30 días")
+
+
+def test_resultado_expone_una_vista_de_solo_lectura_de_las_estadisticas(agent):
+    async def fake_run(user_input):
+        return "ok"
+
+    agent._arun_agent = fake_run
+
+    result = agent.process_query("¿Cómo devuelvo algo?")
+    agent.stats["tools_used"]["Consulta RAG"] += 1
+
+    assert result["stats"] is agent._stats_view
+    assert result["stats"]["total_interactions"] == 1
+    with pytest.raises(TypeError):
+        result["stats"]["errors"] = 1
+
+    snapshot = agent.stats_snapshot()
+    assert json.loads(json.dumps(snapshot))["tools_used"] == {"Consulta RAG": 1}
+
+
+def test_stream_query_informa_el_estado_al_final(agent):
+    async def tokens(prompt, **kwargs):
+        yield "ho"
+        yield "la"
+
+    async def failing(prompt, **kwargs):
+        raise RuntimeError("fallo")
+        yield
+
+    agent.agent = SimpleNamespace(astream=tokens)
+    chunks = list(agent.stream_query("¿Puedo devolver algo?", with_status=True))
+
+    assert chunks[:2] == ["ho", "la"]
+    assert chunks[-1]["agent_status"] == "success"
+    assert chunks[-1]["stats"]["successful_interactions"] == 1
+
+    agent.agent = SimpleNamespace(astream=failing)
+    chunks = list(agent.stream_query("¿Puedo devolver algo?", with_status=True))
+
+    assert chunks[-1]["agent_status"] == "error"
+    assert chunks[-1]["error"] == "fallo"
+    assert all(isinstance(chunk, str) for chunk in agent.stream_query("¿Puedo devolver algo?"))
+
+
+def test_agente_descartado_cierra_su_logger(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    agent = EcoAgent()
+    agent_logger = agent.logger
+
+    del agent
+    gc.collect()
+
+    assert agent_logger._closed
+    assert not agent_logger._worker.is_alive()
+    assert agent_logger not in _OPEN_LOGGERS
+
+
+@pytest.fixture
+def simulated_agent(tmp_path, monkeypatch):
+    """Agente completo en modo simulado (sin API key)."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    agent = EcoAgent()
+    agent.initialize_agent()
+    yield agent
+    agent.close()
+
+
+def test_consulta_informativa_responde_con_las_politicas(simulated_agent):
+    result = simulated_agent.process_query("¿Cuáles son las políticas de devolución para laptops?")
+
+    assert result["agent_status"] == "success"
+    assert "POLÍTICAS GENERALES DE DEVOLUCIÓN" in result["response"]
+    assert "Computadoras: Garantía de 15 días" in result["response"]
+    assert simulated_agent.stats["tools_used"]["Consultar Políticas de Devolución"] == 1
+    assert simulated_agent.stats["tools_used"]["Consulta RAG"] == 1
+
+
+def test_consultas_informativas_concurrentes(simulated_agent):
+    queries = [f"¿Cuáles son las políticas para tablets {i}?" for i in range(8)]
+
+    results = simulated_agent.process_queries_batch(queries)
+
+    assert [result["agent_status"] for result in results] == ["success"] * 8
+    assert all("Tablets: Garantía de 7 días" in result["response"] for result in results)
+
+
+class RecordingLLM:
+    """Envuelve el LLM simulado y guarda los prompts recibidos."""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return self.llm(prompt)
+
+
+def record_prompts(agent):
+    recorder = RecordingLLM(agent.llm)
+    agent.llm = agent.agent.llm = recorder
+    return recorder.prompts
+
+
+def test_saludo_de_extremo_a_extremo_sin_planificador(simulated_agent):
+    prompts = record_prompts(simulated_agent)
+
+    result = simulated_agent.process_query("Hola")
+
+    assert result["agent_status"] == "success"
+    assert len(prompts) == 1
+    assert "PLANIFICACIÓN" not in prompts[0]
+    assert not simulated_agent.stats["tools_used"]
+
+
+def test_consulta_informativa_de_extremo_a_extremo_con_plan_fijo(simulated_agent):
+    prompts = record_prompts(simulated_agent)
+
+    result = simulated_agent.process_query("¿Cuáles son las políticas de devolución?")
+
+    assert result["agent_status"] == "success"
+    assert _POLITICAS_GENERALES.strip() in result["response"]
+    # Solo la llamada final: el plan fijo no pasa por el planificador
+    assert len(prompts) == 1
+    assert LLMCompilerAgent.RESULTS_HEADER in prompts[0]
+
+
+def test_accion_de_extremo_a_extremo_pasa_por_el_planificador(simulated_agent):
+    prompts = record_prompts(simulated_agent)
+
+    result = simulated_agent.process_query("¿Puedo devolver PROD001 comprado el 2024-10-01?")
+
+    assert result["agent_status"] == "success"
+    assert "PLANIFICACIÓN" in prompts[0]
+    assert result["response"] == simulated_agent.llm.llm._RESPONSES["devolucion"]
@@ -0,0 +1,230 @@
+"""
+Pruebas del planificador LLMCompiler (agente/planner.py).
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from agente.planner import LLMCompilerAgent, make_async
+
+
+class ScriptedLLM:
+    """LLM de prueba: devuelve los planes indicados en orden y registra los prompts."""
+
+    def __init__(self, plans):
+        self.plans = list(plans)
+        self.prompts = []
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        if "PLANIFICACIÓN" in prompt:
+            return json.dumps(self.plans.pop(0)) if self.plans else "[]"
+        return "respuesta final"
+
+
+def make_tool(name, func):
+    return SimpleNamespace(name=name, description=name, func=func, coroutine=make_async(func))
+
+
+def make_agent(plans, tools):
+    llm = ScriptedLLM(plans)
+    return LLMCompilerAgent(llm, tools), llm
+
+
+def test_parse_plan_extrae_la_lista_json():
+    plan = LLMCompilerAgent._parse_plan('Plan:\n[{"id": 1, "tool": "A", "args": []}, {"foo": 2}]')
+    assert plan == [{"id": 1, "tool": "A", "args": []}]
+
+
+def test_parse_plan_invalido_equivale_a_sin_herramientas():
+    assert LLMCompilerAgent._parse_plan("sin plan") == []
+    assert LLMCompilerAgent._parse_plan("[{no es json}]") == []
+
+
+def test_resolve_arg_sustituye_referencias():
+    outputs = {1: "uno", "b": "be"}
+    assert LLMCompilerAgent._resolve_arg("$1", outputs) == "uno"
+    assert LLMCompilerAgent._resolve_arg("$b", outputs) == "be"
+    assert LLMCompilerAgent._resolve_arg("$9", outputs) == "$9"
+    assert LLMCompilerAgent._resolve_arg("texto", outputs) == "texto"
+
+
+def test_dependencias_reciben_el_resultado_del_nodo_previo():
+    tools = [make_tool("A", lambda: "salida-a"), make_tool("B", lambda x: f"b({x})")]
+    plan = [{"id": 1, "tool": "A", "args": [], "deps": []},
+            {"id": 2, "tool": "B", "args": ["$1"], "deps": [1]}]
+    agent, _ = make_agent([plan], tools)
+
+    observations = asyncio.run(agent.aexecute("consulta"))
+
+    assert [output for _, output in observations] == ["salida-a", "b(salida-a)"]
+
+
+def test_nodos_independientes_se_ejecutan_en_paralelo():
+    async def scenario():
+        started = asyncio.Event()
+
+        async def first():
+            started.set()
+            return "primero"
+
+        async def second():
+            # Solo termina si el otro nodo arrancó a la vez
+            await asyncio.wait_for(started.wait(), timeout=1)
+            return "segundo"
+
+        tools = [SimpleNamespace(name="A", description="A", func=None, coroutine=second),
+                 SimpleNamespace(name="B", description="B", func=None, coroutine=first)]
+        plan = [{"id": 1, "tool": "A", "args": []}, {"id": 2, "tool": "B", "args": []}]
+        agent, _ = make_agent([plan], tools)
+        return await agent.aexecute("consulta")
+
+    observations = asyncio.run(scenario())
+    assert [output for _, output in observations] == ["segundo", "primero"]
+
+
+def test_error_provoca_una_nueva_ronda_de_planificacion():
+    tools = [make_tool("A", lambda x: f"a({x})")]
+    plans = [[{"id": 1, "tool": "Inexistente", "args": []}],
+             [{"id": 2, "tool": "A", "args": ["ok"]}]]
+    agent, llm = make_agent(plans, tools)
+
+    observations = asyncio.run(agent.aexecute("consulta"))
+
+    assert observations[0][1].startswith("Error en Inexistente")
+    assert observations[1][1] == "a(ok)"
+    assert "RESULTADOS PREVIOS" in llm.prompts[1]
+
+
+def test_args_con_nombre_se_pasan_como_kwargs():
+    calls = []
+
+    def verificar(producto_id, fecha_compra):
+        calls.append((producto_id, fecha_compra))
+        return "ok"
+
+    plan = [{"id": 1, "tool": "V", "args": {"producto_id": "PROD001", "fecha_compra": "2024-10-01"}}]
+    agent, _ = make_agent([plan], [make_tool("V", verificar)])
+
+    observations = asyncio.run(agent.aexecute("consulta"))
+
+    assert calls == [("PROD001", "2024-10-01")]
+    assert observations[0][1] == "ok"
+
+
+def test_args_con_tipo_invalido_son_un_error_del_nodo():
+    calls = []
+    tools = [make_tool("V", lambda *args: calls.append(args) or "ok")]
+    plans = [[{"id": 1, "tool": "V", "args": "PROD001"}], []]
+    agent, llm = make_agent(plans, tools)
+
+    observations = asyncio.run(agent.aexecute("consulta"))
+
+    assert calls == []
+    assert observations[0][1].startswith("Error en V")
+    assert "RESULTADOS PREVIOS" in llm.prompts[1]
+
+
+def test_arun_combina_las_observaciones_en_la_respuesta():
+    tools = [make_tool("A", lambda: "dato")]
+    agent, llm = make_agent([[{"id": 1, "tool": "A", "args": []}]], tools)
+
+    assert asyncio.run(agent.arun("consulta")) == "respuesta final"
+    assert "[1] A(): dato" in llm.prompts[-1]
+
+
+def test_plan_fijo_omite_la_llamada_al_planificador():
+    tools = [make_tool("A", lambda x: f"a({x})")]
+    agent, llm = make_agent([], tools)
+
+    answer = asyncio.run(agent.arun("consulta", plan=[{"id": 1, "tool": "A", "args": ["x"]}]))
+
+    assert answer == "respuesta final"
+    assert len(llm.prompts) == 1
+    assert "[1] A(x): a(x)" in llm.prompts[0]
+
+
+def test_llamada_especulativa_coincidente_se_reutiliza():
+    calls = []
+    tools = [make_tool("A", lambda x: calls.append(x) or f"a({x})")]
+
+    async def scenario():
+        speculative = {("A", ("x",)): asyncio.create_task(asyncio.sleep(0, result="especulado"))}
+        agent, _ = make_agent([], tools)
+        observations = await agent.aexecute("consulta", speculative,
+                                            plan=[{"id": 1, "tool": "A", "args": ["x"]}])
+        return observations, speculative
+
+    observations, speculative = asyncio.run(scenario())
+
+    assert calls == []
+    assert observations[0][1] == "especulado"
+    assert speculative == {}
+
+
+def test_llamada_especulativa_distinta_se_descarta_y_cancela():
+    calls = []
+    tools = [make_tool("A", lambda x: calls.append(x) or f"a({x})")]
+
+    async def scenario():
+        task = asyncio.create_task(asyncio.sleep(10, result="especulado"))
+        speculative = {("A", ("otro",)): task}
+        agent, _ = make_agent([], tools)
+        observations = await agent.aexecute("consulta", speculative,
+                                            plan=[{"id": 1, "tool": "A", "args": ["x"]}])
+        # La tarea ya terminó (cancelada) al volver de aexecute
+        return observations, speculative, task.done(), task.cancelled()
+
+    observations, speculative, done, cancelled = asyncio.run(scenario())
+
+    assert calls == ["x"]
+    assert observations[0][1] == "a(x)"
+    assert speculative == {}
+    assert done and cancelled
+
+
+class RecordingCallback:
+    """Callback de prueba que guarda las acciones y respuestas finales."""
+
+    def __init__(self):
+        self.actions = []
+        self.finishes = []
+
+    def on_agent_action(self, action):
+        self.actions.append(action)
+
+    def on_agent_finish(self, finish):
+        self.finishes.append(finish)
+
+
+def test_callbacks_reciben_acciones_con_args_posicionales_y_con_nombre():
+    callback = RecordingCallback()
+    tools = [make_tool("A", lambda x, y: f"{x}-{y}"), make_tool("B", lambda categoria=None: f"b({categoria})")]
+    plan = [{"id": 1, "tool": "A", "args": ["PROD001", "2024-10-01"]},
+            {"id": 2, "tool": "B", "args": {"categoria": "Audio"}}]
+    llm = ScriptedLLM([plan])
+    agent = LLMCompilerAgent(llm, tools, callbacks=[callback])
+
+    answer = asyncio.run(agent.arun("consulta"))
+
+    assert answer == "respuesta final"
+    inputs = {action.tool: action.tool_input for action in callback.actions}
+    assert json.loads(inputs["A"]) == ["PROD001", "2024-10-01"]
+    assert inputs["B"] == {"categoria": "Audio"}
+    assert "[1] A(PROD001, 2024-10-01): PROD001-2024-10-01" in llm.prompts[-1]
+    assert len(callback.finishes) == 1
+
+
+def test_error_en_un_callback_solo_afecta_al_nodo():
+    class FailingCallback(RecordingCallback):
+        def on_agent_action(self, action):
+            raise RuntimeError("callback roto")
+
+    tools = [make_tool("A", lambda: "dato")]
+    llm = ScriptedLLM([[{"id": 1, "tool": "A", "args": []}], []])
+    agent = LLMCompilerAgent(llm, tools, callbacks=[FailingCallback()])
+
+    observations = asyncio.run(agent.aexecute("consulta"))
+
+    assert observations[0][1] == "Error en A: callback roto"
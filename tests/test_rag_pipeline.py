@@ -0,0 +1,171 @@
+"""
+Pruebas del pipeline RAG (agente/rag_pipeline.py).
+"""
+
+import asyncio
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+
+from agente.planner import run_sync
+from agente.rag_pipeline import (
+    HNSW_MIN_VECTORS,
+    QUANTIZE_MIN_VECTORS,
+    EcoRAGPipeline,
+    locked_cached_property,
+)
+
+
+class Component:
+    def __init__(self):
+        self.builds = 0
+
+    @locked_cached_property
+    def value(self):
+        self.builds += 1
+        time.sleep(0.05)
+        return object()
+
+
+def test_locked_cached_property_construye_una_sola_vez():
+    component = Component()
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(component.value)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert component.builds == 1
+    assert all(result is results[0] for result in results)
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(EcoRAGPipeline, "_create_embeddings", lambda self: "embeddings")
+    return EcoRAGPipeline()
+
+
+def test_initialize_embeddings_descarta_los_componentes_dependientes(pipeline):
+    pipeline.__dict__.update(vectorstore="vs", retriever="ret", qa_chain="qa")
+
+    pipeline.initialize_embeddings()
+
+    assert pipeline.embeddings == "embeddings"
+    for name in ("vectorstore", "retriever", "qa_chain"):
+        assert name not in pipeline.__dict__
+
+
+def test_aget_embeddings_construye_fuera_del_event_loop(pipeline):
+    async def scenario():
+        loop_thread = threading.get_ident()
+        build_threads = []
+        original = pipeline._create_embeddings
+
+        def tracked():
+            build_threads.append(threading.get_ident())
+            return original()
+
+        pipeline._create_embeddings = tracked
+        first = await pipeline.aget_embeddings()
+        second = await pipeline.aget_embeddings()
+        return loop_thread, build_threads, first, second
+
+    loop_thread, build_threads, first, second = asyncio.run(scenario())
+
+    assert first == second == "embeddings"
+    assert len(build_threads) == 1
+    assert build_threads[0] != loop_thread
+
+
+@pytest.fixture
+def simulated_pipeline(tmp_path, monkeypatch):
+    """Pipeline sin embeddings (vectorstore simulado) y sin directorio data."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(EcoRAGPipeline, "_create_embeddings", lambda self: None)
+    return EcoRAGPipeline()
+
+
+def test_arranque_en_frio_con_el_executor_del_agente_ocupado(simulated_pipeline):
+    async def scenario():
+        # Más consultas simultáneas que hilos tiene el executor por defecto del loop compartido
+        workers = min(32, (os.cpu_count() or 1) + 4)
+        return await asyncio.gather(*(
+            asyncio.to_thread(simulated_pipeline.query, "¿Cuántos días tengo para devolver audio?")
+            for _ in range(workers + 1)
+        ))
+
+    results = run_sync(asyncio.wait_for(scenario(), timeout=30))
+
+    assert {result["status"] for result in results} == {"success"}
+
+
+def test_fallo_al_construir_el_vectorstore_no_se_oculta(simulated_pipeline, monkeypatch):
+    original = EcoRAGPipeline._load_default_documents
+    monkeypatch.setattr(EcoRAGPipeline, "_load_default_documents",
+                        lambda self: (_ for _ in ()).throw(OSError("disco no disponible")))
+
+    result = simulated_pipeline.query("políticas")
+
+    assert result["status"] == "error"
+    assert "vectorstore" not in simulated_pipeline.__dict__
+
+    monkeypatch.setattr(EcoRAGPipeline, "_load_default_documents", original)
+
+    result = simulated_pipeline.query("políticas de devolución")
+
+    assert result["status"] == "success"
+    assert result["source_documents"]
+
+
+@pytest.mark.parametrize("size, index_type", [
+    (QUANTIZE_MIN_VECTORS - 1, "IndexFlatIP"),
+    (QUANTIZE_MIN_VECTORS, "IndexScalarQuantizer"),
+    (HNSW_MIN_VECTORS - 1, "IndexScalarQuantizer"),
+    (HNSW_MIN_VECTORS, "IndexHNSWFlat"),
+])
+def test_tipo_de_indice_faiss_segun_el_numero_de_vectores(pipeline, size, index_type):
+    pytest.importorskip("faiss")
+    vectors = np.random.default_rng(0).standard_normal((size, 8)).astype(np.float32)
+    chunks = [Document(page_content=f"fragmento {i}") for i in range(size)]
+
+    vectorstore = pipeline._build_faiss_vectorstore(chunks, vectors)
+
+    assert type(vectorstore.index).__name__ == index_type
+    assert vectorstore.index.ntotal == size
+    assert not vectorstore._normalize_L2
+
+
+def docs(*texts):
+    return [Document(page_content=text) for text in texts]
+
+
+def test_vectorstore_simulado_puntua_por_apariciones_y_desempata_por_orden(simulated_pipeline):
+    documents = docs("audio audio garantía", "tablets", "audio garantía", "garantía audio", "nada")
+    store = simulated_pipeline._create_simulated_vectorstore(documents)
+
+    results = store.similarity_search("Audio", k=4)
+
+    assert results == [documents[0], documents[2], documents[3]]
+    assert store.similarity_search("garantía audio", k=2) == [documents[0], documents[2]]
+    assert store.similarity_search("inexistente") == []
+    assert store.similarity_search("audio", k=0) == []
+
+
+def test_vectorstore_denso_ordena_por_similitud_coseno(pipeline):
+    vectors = {"a": [1.0, 0.0], "b": [0.6, 0.8], "c": [0.0, 1.0], "d": [1.0, 0.0]}
+    pipeline.__dict__["embeddings"] = SimpleNamespace(embed_query=lambda text: [3.0, 0.0])
+    documents = docs(*vectors)
+
+    store = pipeline._create_dense_vectorstore(documents, np.asarray(list(vectors.values()), dtype=np.float32))
+
+    assert store.similarity_search("consulta", k=3) == [documents[0], documents[3], documents[1]]
+    assert store.similarity_search("consulta", k=10) == [documents[0], documents[3], documents[1], documents[2]]
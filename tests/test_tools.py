@@ -0,0 +1,80 @@
+"""
+Pruebas de las herramientas de productos (agente/tools.py).
+"""
+
+import re
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from agente import verificar_elegibilidad_batch
+from agente.tools import _MENSAJES_CONDICIONES, _POLITICAS_GENERALES, ProductoTools, _parse_fecha
+
+
+@pytest.fixture(scope="module")
+def tools():
+    return ProductoTools()
+
+
+def test_verificar_batch_combina_producto_fecha_y_garantia(tools):
+    producto_id = next(iter(tools.productos_db))
+    garantia = tools.productos_db[producto_id]["garantia_dias"]
+    elegible = tools.productos_db[producto_id]["elegible_devolucion"]
+    reciente = (date.today() - timedelta(days=1)).isoformat()
+    vencida = (date.today() - timedelta(days=garantia + 1)).isoformat()
+
+    result = tools.verificar_batch(
+        [producto_id, producto_id, "NO_EXISTE", producto_id],
+        [reciente, vencida, reciente, "no-es-fecha"],
+    )
+
+    assert result.dtype == np.bool_
+    assert result.tolist() == [elegible, False, False, False]
+
+
+def test_verificar_batch_rechaza_listas_de_distinta_longitud(tools):
+    with pytest.raises(ValueError):
+        tools.verificar_batch(["PROD001", "PROD002"], ["2024-01-01"])
+
+
+def test_verificar_elegibilidad_batch_devuelve_una_lista_de_bool():
+    reciente = (date.today() - timedelta(days=1)).isoformat()
+
+    assert verificar_elegibilidad_batch(["PROD001", "PROD004"], [reciente, reciente]) == [True, False]
+
+
+def test_condiciones_adicionales_combinan_limite_y_alto_valor(tools):
+    laptop = tools.productos_db["PROD002"]
+
+    assert tools._verificar_condiciones_adicionales(laptop, 1) == _MENSAJES_CONDICIONES[2]
+    assert tools._verificar_condiciones_adicionales(laptop, 14) == _MENSAJES_CONDICIONES[3]
+    assert tools._verificar_condiciones_adicionales(tools.productos_db["PROD003"], 1) == _MENSAJES_CONDICIONES[0]
+
+
+def test_parse_fecha_acepta_fechas_sin_relleno():
+    assert _parse_fecha("2024-01-05") == date(2024, 1, 5)
+    assert _parse_fecha("2024-1-5") == date(2024, 1, 5)
+    with pytest.raises(ValueError):
+        _parse_fecha("2024-02-30")
+    with pytest.raises(ValueError):
+        _parse_fecha("05/01/2024")
+
+
+def test_politicas_generales_por_categoria_y_desconocida(tools):
+    assert tools.consultar_politicas_devolucion() == _POLITICAS_GENERALES
+
+    audio = tools.consultar_politicas_devolucion("Audio")
+    assert audio.startswith(_POLITICAS_GENERALES)
+    assert audio.endswith("🎧 Audio: Garantía de 14 días, incluye auriculares, altavoces y equipos de sonido.")
+
+    desconocida = tools.consultar_politicas_devolucion("Juguetes")
+    assert desconocida.startswith(_POLITICAS_GENERALES)
+    assert "Categoría 'Juguetes' no encontrada" in desconocida
+
+
+def test_codigo_devolucion_con_fecha_y_sufijo_base32(tools):
+    codigos = {tools._generar_codigo_devolucion(datetime(2024, 3, 7, 9, 5, 2)) for _ in range(20)}
+
+    assert all(re.fullmatch(r"DEV-20240307090502-[A-Z2-7]{4}", codigo) for codigo in codigos)
+    assert len(codigos) > 1